@@ -1,3 +1,3 @@
 """Hikvision sync module for Angajati to device synchronization."""
 
-from . import models, supabase_client, isapi_client, orchestration, events
+from . import models, http_client, supabase_client, isapi_client, orchestration, events
@@ -1,21 +1,290 @@
 """Event handling for Hikvision device events."""
 
-import json
+import asyncio
+import atexit
+import io
 import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
 import urllib.parse
-import xml.etree.ElementTree as ET
-from datetime import date
+import xml.etree.ElementTree as StdET
+from datetime import date, datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Optional, TYPE_CHECKING
+from typing import Any, Optional, Tuple, TYPE_CHECKING
+
+from . import json_codec
+
+try:
+    from lxml import etree as ET
+except ImportError:  # declared, but keep working where no wheel is available
+    ET = None
+
+_MAX_PART_HEADER_LEN = 1024
+# bytes.strip() whitespace, as ints for indexing into the body
+_MULTIPART_WHITESPACE = frozenset(b" \t\n\r\x0b\x0c")
+_XML_SNIFF_LEN = 64
+# Every access event carries majorEventType; bodies without it are never parsed
+_ACCESS_EVENT_HINT = b"majorEventType"
+# Upper bound on queued Supabase saves handed to one bulk call
+_SAVE_BATCH_SIZE = 64
+# AccessControllerEvent field names, interned once so event dicts share key objects
+_KNOWN_TAGS = frozenset(map(sys.intern, (
+    "AccessControllerEvent", "EventNotificationAlert", "ipAddress", "portNo", "protocol",
+    "macAddress", "channelID", "dateTime", "activePostCount", "eventType", "eventState",
+    "eventDescription", "deviceName", "majorEventType", "subEventType", "name", "cardNo",
+    "cardType", "employeeNoString", "cardReaderNo", "doorNo", "verifyNo", "serialNo",
+    "userType", "currentVerifyMode", "attendanceStatus", "label", "mask", "picturesNumber",
+    "statusValue", "frontSerialNo", "purePwdVerifyEnable", "time",
+)))
+_TAG_CACHE_SIZE = 1024
+# Raw (possibly namespaced) tag -> interned local name
+_TAG_NAMES = {tag: tag for tag in _KNOWN_TAGS}
+# majorEventType/subEventType values as JSON members or XML elements (optionally namespaced)
+_MAJOR_EVENT_RE = re.compile(rb'"majorEventType"\s*:\s*"?(\d+)|<(?:[\w.-]+:)?majorEventType>\s*(\d+)\s*<')
+_SUB_EVENT_RE = re.compile(rb'"subEventType"\s*:\s*"?(\d+)|<(?:[\w.-]+:)?subEventType>\s*(\d+)\s*<')
+_BOUNDARY_RE = re.compile(r'(?:^|;)\s*boundary=(?:"([^"]+)"|([^;\s]+))', re.IGNORECASE)
+
+if ET is not None:
+    _XML_ELEMENT_TYPES = (ET._Element, StdET.Element)
+    _XML_ITERPARSE_KWARGS = {"resolve_entities": False, "no_network": True}
+else:
+    ET = StdET
+    _XML_ELEMENT_TYPES = (StdET.Element,)
+    _XML_ITERPARSE_KWARGS = {}
+
+_loads = json_codec.loads
+_tls = threading.local()
+# Minimum spacing of "log queue full" warnings per DailyLogger
+_DROP_WARN_INTERVAL_SEC = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def _xml_parser():
+    """
+    Return this thread's lxml parser, creating it on first use.
+
+    lxml parsers are not thread-safe, so each worker thread keeps its own.
+    Entity resolution and network access are disabled for device payloads.
+    Returns None with the stdlib backend, whose parsers cannot be reused.
+    """
+    if ET is StdET:
+        return None
+    parser = getattr(_tls, "xml_parser", None)
+    if parser is None:
+        parser = _tls.xml_parser = ET.XMLParser(resolve_entities=False, no_network=True, huge_tree=False)
+    return parser
 
 if TYPE_CHECKING:
     from .supabase_client import SupabaseClient
 
 
+class BufferedFileHandler(logging.Handler):
+    """
+    Append-only file handler that batches writes in a BufferedWriter.
+
+    Records are not flushed one by one: the buffer is written when full, every
+    flush_interval seconds by a daemon thread, and on close().
+    """
+
+    def __init__(self, filename, buffer_size: int = 64 * 1024, flush_interval: float = 30.0):
+        super().__init__()
+        self.baseFilename = str(filename)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._stream = open(filename, "ab", buffering=buffer_size)
+        self._stop_flush = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically,
+            name=f"log-flush:{Path(filename).name}",
+            daemon=True,
+        )
+        self._flusher.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + "\n").encode("utf-8", "replace")
+            if self._stream is not None:
+                self._write(data)
+        except Exception:
+            self.handleError(record)
+
+    def _write(self, data: bytes):
+        self._stream.write(data)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._stream is not None:
+                self._stream.flush()
+        finally:
+            self.release()
+
+    def _flush_periodically(self):
+        while not self._stop_flush.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def close(self):
+        self._stop_flush.set()
+        self.acquire()
+        try:
+            if self._stream is not None:
+                try:
+                    self._stream.flush()
+                finally:
+                    self._stream.close()
+                    self._stream = None
+        finally:
+            self.release()
+        super().close()
+
+
+class DailyRotatingFileHandler(BufferedFileHandler):
+    """
+    BufferedFileHandler writing to log_dir/YYYY/MM/<filename_template>.
+
+    The file switches to the new day's path at local midnight and is rolled over to
+    numbered backups (name.1 ... name.backup_count) once it would exceed max_bytes.
+    Rotation happens on the writer thread; the file stays open between rotations.
+    """
+
+    def __init__(
+        self,
+        log_dir: Path,
+        filename_template: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        backup_count: int = 10,
+        **kwargs,
+    ):
+        self.log_dir = Path(log_dir)
+        self.filename_template = filename_template
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._rollover_at = 0.0
+        super().__init__(self._todays_filename(), **kwargs)
+        self._size = os.path.getsize(self.baseFilename)
+
+    def _todays_filename(self) -> Path:
+        today = date.today()
+        # Epoch timestamp of the next local midnight; emit() only does date work past this point
+        self._rollover_at = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+        # Create year/month subdirectory structure: YYYY/MM/
+        year_month_dir = self.log_dir / str(today.year) / f"{today.month:02d}"
+        year_month_dir.mkdir(parents=True, exist_ok=True)
+        return year_month_dir / self.filename_template.format(date=today.isoformat())
+
+    def _reopen(self, filename):
+        self._stream.close()
+        self.baseFilename = str(filename)
+        self._stream = open(filename, "ab", buffering=self.buffer_size)
+        self._size = os.path.getsize(filename)
+
+    def _roll_by_size(self):
+        self._stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.baseFilename}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.baseFilename}.{i + 1}")
+            os.replace(self.baseFilename, f"{self.baseFilename}.1")
+        else:
+            os.remove(self.baseFilename)
+        self._stream = open(self.baseFilename, "ab", buffering=self.buffer_size)
+        self._size = 0
+
+    def _write(self, data: bytes):
+        if time.time() >= self._rollover_at:
+            self._reopen(self._todays_filename())
+        elif self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._roll_by_size()
+        self._stream.write(data)
+        self._size += len(data)
+
+
+class DropOldestQueueHandler(QueueHandler):
+    """QueueHandler for a bounded queue that discards the oldest record when full.
+
+    A full queue first gets up to put_timeout seconds for the writer thread to make
+    room (back-pressure instead of loss); only then is the oldest record dropped.
+    Drops are reported on this module's logger (not the queued one) at most once
+    per _DROP_WARN_INTERVAL_SEC; each report covers only the drops since the last.
+    """
+
+    def __init__(self, record_queue: queue.Queue, label: str = "", put_timeout: float = 0.0):
+        super().__init__(record_queue)
+        self.label = label
+        self.put_timeout = put_timeout
+        self.dropped = 0  # since the last report
+        self._next_drop_warning = 0.0
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.put_timeout > 0:
+            try:
+                self.queue.put(record, timeout=self.put_timeout)
+                return
+            except queue.Full:
+                pass
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    continue
+                now = time.monotonic()
+                if now >= self._next_drop_warning:
+                    self._next_drop_warning = now + _DROP_WARN_INTERVAL_SEC
+                    self.report_dropped()
+
+    def report_dropped(self):
+        """Log the drops since the last report (if any) and reset the count."""
+        self.acquire()
+        try:
+            dropped, self.dropped = self.dropped, 0
+        finally:
+            self.release()
+        if dropped:
+            logger.warning("Log queue for %s was full: dropped %d oldest record(s)", self.label, dropped)
+
+
+class _BoundedQueueListener(QueueListener):
+    """QueueListener whose stop sentinel waits for room in a full bounded queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
 class DailyLogger:
-    """Logger that rotates log files daily."""
+    """Logger that rotates log files daily and caps their size.
+
+    Records are enqueued by a QueueHandler and written to disk by a background
+    QueueListener thread, so callers on the event loop never block on file I/O.
+    """
     
-    def __init__(self, name: str, filename_template: str, log_dir: Path, subfolder: str = ""):
+    def __init__(
+        self,
+        name: str,
+        filename_template: str,
+        log_dir: Path,
+        subfolder: str = "",
+        max_queued: int = 65536,
+        max_bytes: int = 100 * 1024 * 1024,
+        backup_count: int = 10,
+        put_timeout: float = 1.0,
+        level: int = logging.INFO,
+    ):
         """
         Initialize daily rotating logger.
         
@@ -24,36 +293,80 @@ class DailyLogger:
             filename_template: Template for log filename (e.g., "hikvision_events_{date}.log")
             log_dir: Base log directory (e.g., Path("logs"))
             subfolder: Subfolder name within log_dir (e.g., "hikvision_events")
+            max_queued: Records held for the writer thread (sized for event bursts)
+            max_bytes: Size at which the day's file is rolled over to a numbered backup (0 disables)
+            backup_count: Numbered backups kept per day
+            put_timeout: Seconds a caller waits on a full queue before the oldest record is dropped
+            level: Logger level (DEBUG also writes raw event bodies)
         """
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.INFO)
+        self.logger.setLevel(level)
         self.logger.propagate = False
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._queue_handler = DropOldestQueueHandler(self._queue, name, put_timeout)
+        self.logger.addHandler(self._queue_handler)
+        self._listener: Optional[QueueListener] = None
+        self._file_handler: Optional[DailyRotatingFileHandler] = None
         self.filename_template = filename_template
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
         # Create subfolder path: log_dir / subfolder
         self.log_dir = log_dir / subfolder if subfolder else log_dir
         self.log_dir.mkdir(parents=True, exist_ok=True)
-        self.current_date = None
+        atexit.register(self.close)
 
     def get(self) -> logging.Logger:
-        today = date.today()
-        today_iso = today.isoformat()
-        if self.current_date != today_iso:
-            for handler in list(self.logger.handlers):
-                self.logger.removeHandler(handler)
-                handler.close()
-            
-            # Create year/month subdirectory structure: YYYY/MM/
-            year_month_dir = self.log_dir / str(today.year) / f"{today.month:02d}"
-            year_month_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Place log file in year/month directory
-            log_file = year_month_dir / self.filename_template.format(date=today_iso)
-            handler = logging.FileHandler(log_file)
-            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
-            self.logger.addHandler(handler)
-            self.current_date = today_iso
+        if self._listener is None:
+            self._start_listener()
         return self.logger
 
+    def _start_listener(self):
+        handler = DailyRotatingFileHandler(
+            self.log_dir,
+            self.filename_template,
+            max_bytes=self.max_bytes,
+            backup_count=self.backup_count,
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._file_handler = handler
+        self._listener = _BoundedQueueListener(self._queue, handler, respect_handler_level=True)
+        self._listener.start()
+
+    def _stop_listener(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._queue_handler.report_dropped()
+        if self._file_handler is not None:
+            self._file_handler.close()
+            self._file_handler = None
+
+    def close(self):
+        """Flush queued records and close the current log file."""
+        self._stop_listener()
+
+
+class _EventPreview:
+    """Truncated JSON rendering of an event, serialized only if the log record is emitted."""
+
+    __slots__ = ("event", "limit")
+
+    def __init__(self, event, limit: int = 500):
+        self.event = event
+        self.limit = limit
+
+    def __str__(self) -> str:
+        try:
+            data = json_codec.dumps_bytes(self.event)
+        except Exception:
+            data = repr(self.event).encode("utf-8", "replace")
+        if len(data) <= self.limit:
+            return data.decode("utf-8", "replace")
+        return data[:self.limit].decode("utf-8", "ignore") + "...(truncated)"
+
 
 def extract_event(parsed):
     """Extract AccessControllerEvent from parsed request body."""
@@ -61,10 +374,11 @@ def extract_event(parsed):
         event = parsed.get("AccessControllerEvent")
         if isinstance(event, dict):
             return event
-    elif isinstance(parsed, ET.Element):
+    elif isinstance(parsed, _XML_ELEMENT_TYPES):
         event = parsed.find("AccessControllerEvent")
         if event is not None:
-            return {child.tag: child.text for child in event}
+            # lxml exposes comments/PIs as children with non-string tags
+            return {_xml_local_name(child.tag): child.text for child in event if isinstance(child.tag, str)}
     return None
 
 
@@ -84,71 +398,305 @@ def extract_mediu(parsed) -> Optional[str]:
 
 def is_access_event(parsed) -> bool:
     """Check if parsed event is an access control event (major=5, sub=75 or 76)."""
-    event = extract_event(parsed)
+    if isinstance(parsed, dict):
+        event = parsed.get("AccessControllerEvent")
+        if not isinstance(event, dict):
+            return False
+    else:
+        event = extract_event(parsed)
     if not event:
         return False
+    return _is_access_fields(event)
+
+
+def _is_access_fields(event: dict) -> bool:
+    """Classify an AccessControllerEvent dict by its majorEventType/subEventType fields."""
+    major = event.get("majorEventType")
+    sub = event.get("subEventType")
+    # JSON payloads carry ints, XML payloads carry text; compare both without coercion first
+    if major == 5 and sub in (75, 76):
+        return True
+    if major == "5" and sub in ("75", "76"):
+        return True
+    if major is None or sub is None:
+        return False
     try:
-        major = int(event.get("majorEventType"))
-        sub = int(event.get("subEventType"))
+        return int(major) == 5 and int(sub) in (75, 76)
     except (TypeError, ValueError):
         return False
-    return major == 5 and sub in (75, 76)
+
+
+def _fast_is_access(body: bytes) -> Optional[bool]:
+    """
+    Classify a raw body from its majorEventType/subEventType bytes without parsing it.
+
+    Returns:
+        True/False when both fields are found, None when the body must be parsed to tell
+    """
+    major = _MAJOR_EVENT_RE.search(body)
+    if major is None:
+        return None
+    sub = _SUB_EVENT_RE.search(body)
+    if sub is None:
+        return None
+    return int(major.group(1) or major.group(2)) == 5 and int(sub.group(1) or sub.group(2)) in (75, 76)
 
 
 def extract_boundary(content_type: str) -> Optional[str]:
     """Extract boundary parameter from multipart content-type header."""
-    parts = [p.strip() for p in content_type.split(";")]
-    for part in parts:
-        if part.lower().startswith("boundary="):
-            boundary = part.split("=", 1)[1]
-            if boundary.startswith('"') and boundary.endswith('"'):
-                boundary = boundary[1:-1]
-            return boundary
+    match = _BOUNDARY_RE.search(content_type)
+    if not match:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def _find_event_log_span(body: bytes, delimiter: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Return (start, end) offsets of the stripped event_log part payload, or None.
+
+    Walks the body with bytes.find (memchr/two-way search in C) and stops at the
+    first event_log part, so trailing picture parts are never scanned.
+    """
+    delimiter_len = len(delimiter)
+    pos = body.find(delimiter)
+    while pos != -1:
+        start = pos + delimiter_len
+        next_pos = body.find(delimiter, start)
+        end = next_pos if next_pos != -1 else len(body)
+        # Part headers are short; never scan into picture data looking for them
+        header_end = body.find(b"\r\n\r\n", start, min(end, start + _MAX_PART_HEADER_LEN))
+        if header_end != -1 and body.find(b'name="event_log"', start, header_end) != -1:
+            start = header_end + 4
+            while start < end and body[start] in _MULTIPART_WHITESPACE:
+                start += 1
+            while end > start and body[end - 1] in _MULTIPART_WHITESPACE:
+                end -= 1
+            return start, end
+        pos = next_pos
     return None
 
 
+def _extract_event_log_scan(body: bytes, boundary: str) -> Optional[bytes]:
+    """Slice out only the event_log part payload, or None if the body has none."""
+    span = _find_event_log_span(body, f"--{boundary}".encode())
+    if span is None:
+        return None
+    return body[span[0]:span[1]]
+
+
 def parse_multipart_event(body: bytes, content_type: str, logger: logging.Logger):
     """Parse multipart/form-data event body and extract event_log JSON."""
     boundary = extract_boundary(content_type)
     if not boundary:
         logger.error("Multipart request missing boundary")
         return None
-    delimiter = f"--{boundary}".encode()
-    for raw_part in body.split(delimiter):
-        part = raw_part.strip()
-        if not part or part == b"--":
-            continue
-        if part.endswith(b"--"):
-            part = part[:-2]
-        header_blob, _, content = part.partition(b"\r\n\r\n")
-        if b'name="event_log"' not in header_blob:
+    # The offset scan stops at the event_log part, so trailing picture parts are never read
+    payload = _extract_event_log_scan(body, boundary)
+    if payload is None:
+        return None
+    try:
+        return _loads(payload)
+    except Exception as exc:
+        logger.error(f"Multipart event_log JSON parse error: {exc}")
+        return None
+
+
+def _xml_local_name(tag) -> str:
+    """Strip the {namespace} prefix ISAPI documents put on every tag (cached, interned)."""
+    name = _TAG_NAMES.get(tag)
+    if name is not None:
+        return name
+    if not isinstance(tag, str):
+        return ""
+    name = sys.intern(tag.rsplit("}", 1)[-1])
+    # Bounded so a device sending arbitrary tag names cannot grow the cache without limit
+    if len(_TAG_NAMES) < _TAG_CACHE_SIZE:
+        _TAG_NAMES[tag] = name
+    return name
+
+
+def parse_xml_access_event(body: bytes) -> Optional[dict]:
+    """
+    Incrementally parse an XML event into the same shape as JSON events.
+
+    Top-level scalar fields (ipAddress, dateTime, ...) are copied as-is and the first
+    AccessControllerEvent element becomes a nested dict. Parsing stops as soon as that
+    element is closed, so trailing picture data is never materialized.
+
+    Returns:
+        dict with "AccessControllerEvent", or None if the document has none
+    """
+    result: dict = {}
+    depth = 0
+    for action, elem in ET.iterparse(io.BytesIO(body), events=("start", "end"), **_XML_ITERPARSE_KWARGS):
+        if action == "start":
+            depth += 1
             continue
-        payload = content.strip()
-        try:
-            return json.loads(payload)
-        except Exception as exc:
-            logger.error(f"Multipart event_log JSON parse error: {exc}")
-            return None
+        depth -= 1
+        name = _xml_local_name(elem.tag)
+        if name == "AccessControllerEvent" and depth <= 1:
+            result["AccessControllerEvent"] = {
+                _xml_local_name(child.tag): child.text for child in elem if isinstance(child.tag, str)
+            }
+            return result
+        if depth == 1:
+            if name and len(elem) == 0:
+                result[name] = elem.text
+            elem.clear()
     return None
 
 
+def _looks_like_xml(body: bytes) -> bool:
+    """True if the first non-whitespace byte is '<' (only a short prefix is copied)."""
+    return body[:_XML_SNIFF_LEN].lstrip().startswith(b"<")
+
+
 def parse_request_body(body: bytes, content_type: str, logger: logging.Logger):
     """Parse request body based on content type (multipart, JSON, or XML)."""
-    if "multipart/form-data" in content_type:
+    # Dispatch on a lowered copy; the original is kept for the case-sensitive boundary
+    ct = content_type.lower()
+    if "multipart/form-data" in ct:
         return parse_multipart_event(body, content_type, logger)
-    if "application/json" in content_type:
+    if "application/json" in ct:
         try:
-            return json.loads(body)
+            return _loads(body)
         except Exception as exc:
             logger.error(f"JSON parse error: {exc}")
-    elif "xml" in content_type or body.strip().startswith(b"<"):
+    elif "xml" in ct or _looks_like_xml(body):
         try:
-            return ET.fromstring(body)
+            event = parse_xml_access_event(body)
+            if event is not None:
+                return event
+            return ET.fromstring(body, _xml_parser())
         except Exception as exc:
             logger.error(f"XML parse error: {exc}")
     return None
 
 
+def parse_and_classify(body: bytes, content_type: str, logger: logging.Logger) -> Tuple[Any, bool, Optional[dict]]:
+    """
+    Parse the body and classify it, extracting the AccessControllerEvent only once.
+
+    Returns:
+        (parsed, is_access, event) where event is the AccessControllerEvent dict, or None
+    """
+    parsed = parse_request_body(body, content_type, logger)
+    if parsed is None:
+        return None, False, None
+    event = extract_event(parsed)
+    if not event:
+        return parsed, False, None
+    return parsed, _is_access_fields(event), event
+
+
+_save_queue: Optional[asyncio.Queue] = None
+_save_drain_task: Optional[asyncio.Task] = None
+# Items of the batch the drain task is currently saving (reported if shutdown cuts it off)
+_saves_in_flight: list = []
+
+
+def enqueue_access_event_save(
+    supabase_client: "SupabaseClient",
+    parsed: dict,
+    event_logger: logging.Logger,
+    label: str = "Supabase",
+) -> str:
+    """
+    Queue an access event for saving by the background drain task.
+    
+    Must be called from a running event loop; the drain task is started on first use.
+    Results are logged to event_logger as the batch completes.
+    
+    Returns:
+        save status "queued"
+    """
+    global _save_queue, _save_drain_task
+    if _save_queue is None:
+        _save_queue = asyncio.Queue()
+    if _save_drain_task is None or _save_drain_task.done():
+        _save_drain_task = asyncio.get_running_loop().create_task(_drain_save_queue(_save_queue))
+    _save_queue.put_nowait((supabase_client, parsed, event_logger, label))
+    return "queued"
+
+
+async def flush_access_event_saves(timeout: float = 10.0):
+    """Wait up to timeout seconds for queued saves, then stop the drain task (call on shutdown)."""
+    global _save_drain_task
+    if _save_queue is not None and _save_drain_task is not None and not _save_drain_task.done():
+        try:
+            await asyncio.wait_for(_save_queue.join(), timeout)
+        except asyncio.TimeoutError:
+            _report_unsaved_events(timeout)
+    if _save_drain_task is not None:
+        _save_drain_task.cancel()
+        _save_drain_task = None
+
+
+def _report_unsaved_events(timeout: float):
+    """Log every access event still queued or mid-save when shutdown stops waiting."""
+    unsaved = list(_saves_in_flight)
+    while not _save_queue.empty():
+        unsaved.append(_save_queue.get_nowait())
+        _save_queue.task_done()
+    logger.error(
+        "Shutdown: %d access event(s) not saved to Supabase after waiting %gs; devices will not resend them",
+        len(unsaved), timeout,
+    )
+    for _, parsed, event_logger, label in unsaved:
+        event_logger.error("Access event not saved to %s before shutdown. Event data: %s", label, _EventPreview(parsed))
+
+
+async def _drain_save_queue(save_queue: asyncio.Queue):
+    """Pull up to _SAVE_BATCH_SIZE queued events at a time and save them per client."""
+    while True:
+        batch = [await save_queue.get()]
+        while len(batch) < _SAVE_BATCH_SIZE and not save_queue.empty():
+            batch.append(save_queue.get_nowait())
+        _saves_in_flight[:] = batch
+        try:
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            await asyncio.gather(*(_save_batch(items) for items in groups.values()))
+        except Exception:
+            logging.getLogger(__name__).exception("Supabase save batch failed")
+        finally:
+            _saves_in_flight.clear()
+            for _ in batch:
+                save_queue.task_done()
+
+
+async def _save_batch(items: list):
+    """Save queued items that share one Supabase client and log each result."""
+    supabase_client = items[0][0]
+    try:
+        results = await supabase_client.save_access_events_bulk([item[1] for item in items])
+    except Exception as exc:
+        results = [exc] * len(items)
+    for (_, parsed, event_logger, label), result in zip(items, results):
+        if isinstance(result, Exception):
+            event_logger.error(
+                "Unexpected error saving access event to %s: %s. Event data: %s",
+                label,
+                result,
+                _EventPreview(parsed),
+            )
+        elif result.get("status") == "success":
+            event_logger.info("Successfully saved access event to %s", label)
+        else:
+            response_text = result.get("response_text", "")
+            status_code = result.get("status_code", "")
+            event_logger.error(
+                "Failed to save access event to %s: %s - %s%s%s. Event data: %s",
+                label,
+                result.get("error_type", "Unknown"),
+                result.get("error", "Unknown error"),
+                f" (Status: {status_code})" if status_code else "",
+                f". Response: {response_text[:200]}" if response_text else "",
+                _EventPreview(parsed),
+            )
+
+
 async def process_event_request(
     body: bytes,
     content_type: str,
@@ -173,18 +721,20 @@ async def process_event_request(
         dict with processing result including save_status
     """
     # Decode path if percent-encoded
-    decoded_path = urllib.parse.unquote(path)
+    decoded_path = urllib.parse.unquote(path) if "%" in path else path
     event_logger.info(f"Received POST to path: {decoded_path}")
     
-    decoded_body = body.decode(errors="ignore")
-    event_logger.info(f"Content-Type: {content_type}")
-    event_logger.info(decoded_body)
+    # Raw bodies can carry megabytes of picture data; only decode them when actually written
+    is_multipart = "multipart/form-data" in content_type.lower()
+    event_logger.info(f"Content-Type: {content_type} body_len={len(body)}")
+    if event_logger.isEnabledFor(logging.DEBUG) and not is_multipart:
+        event_logger.debug(body.decode(errors="ignore"))
     
-    # Parse request body
-    parsed = parse_request_body(body, content_type, event_logger)
-    
-    # Check if it's an access event
-    is_access = parsed and is_access_event(parsed) if parsed else False
+    # Parse and classify (skipped when a byte scan rules out an access event)
+    if _ACCESS_EVENT_HINT in body and _fast_is_access(body) is not False:
+        parsed, is_access, _ = parse_and_classify(body, content_type, event_logger)
+    else:
+        parsed, is_access = None, False
     save_status = None
     
     if is_access:
@@ -192,33 +742,12 @@ async def process_event_request(
         if access_logger:
             access_logger.info(f"Received POST to path: {decoded_path}")
             access_logger.info(f"Content-Type: {content_type}")
-            access_logger.info(decoded_body)
+            # For multipart uploads log the event_log JSON rather than the binary parts
+            access_logger.info(json_codec.dumps(parsed) if is_multipart else body.decode(errors="ignore"))
         
-        # Save to Supabase if requested and client is provided
+        # Queue the Supabase save; the device gets its response without waiting for it
         if save_to_supabase and supabase_client and parsed:
-            try:
-                result = await supabase_client.save_access_event(parsed)
-                if result.get("status") == "success":
-                    save_status = "success"
-                    event_logger.info(f"Successfully saved access event to Supabase")
-                else:
-                    save_status = "error"
-                    error_type = result.get("error_type", "Unknown")
-                    error_msg = result.get("error", "Unknown error")
-                    response_text = result.get("response_text", "")
-                    status_code = result.get("status_code", "")
-                    event_logger.error(
-                        f"Failed to save access event to Supabase: {error_type} - {error_msg}"
-                        f"{f' (Status: {status_code})' if status_code else ''}"
-                        f"{f'. Response: {response_text[:200]}' if response_text else ''}. "
-                        f"Event data: {json.dumps(parsed, default=str)[:500]}"
-                    )
-            except Exception as exc:
-                save_status = "error"
-                event_logger.error(
-                    f"Unexpected error saving access event to Supabase: {exc}. "
-                    f"Event data: {json.dumps(parsed, default=str)[:500]}"
-                )
+            save_status = enqueue_access_event_save(supabase_client, parsed, event_logger)
     
     return {
         "parsed": parsed,
@@ -0,0 +1,35 @@
+"""Shared HTTP client for outbound calls to Supabase (Edge Functions, Storage).
+
+Kept apart from the Supabase and photo helpers so each can use the pool without
+importing the other.
+"""
+
+import asyncio
+from typing import Optional
+
+import httpx
+
+# One pooled client for all Supabase calls (keep-alive and one TLS context for all calls)
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_lock = asyncio.Lock()
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Return the shared Supabase HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        async with _http_client_lock:
+            if _http_client is None:
+                _http_client = httpx.AsyncClient(
+                    timeout=10.0,
+                    limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+                )
+    return _http_client
+
+
+async def aclose_http_client():
+    """Close the shared Supabase HTTP client (call on application shutdown)."""
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
@@ -1,150 +1,544 @@
 """ISAPI client functions for Hikvision device communication."""
 
-import base64
-import json
+import asyncio
+import io
 import logging
-import requests
+import os
+import re
+import time
 import httpx
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
 
-from .models import SyncResult, SyncResultStatus
+from . import json_codec
+from .models import SyncResult, SyncResultCode, SyncResultStatus
 from .photo_url import PhotoResolutionConfig, has_face_photo_source, resolve_downloadable_face_url
 
 # Set up logger for console output
 logger = logging.getLogger(__name__)
 
+# Constant payload parts shared by every build and injected by reference.
+# Read-only: never mutate these or a payload built from them.
+_PERSON_VALID_CONST = {
+    "beginTime": "2025-10-10T00:00:00",
+    "endTime": "2037-12-31T23:59:59",
+    "timeType": "local",
+}
+_PERSON_VALID_BY_ACTIVE = {
+    True: {"enable": True, **_PERSON_VALID_CONST},
+    False: {"enable": False, **_PERSON_VALID_CONST},
+}
+_PERSON_RIGHTPLAN_CONST = ({"doorNo": 1, "planTemplateNo": "1"},)
+_FACE_LIB_CONST = {"faceLibType": "blackFD", "FDID": "1"}
+_ACTIVE_STATUSES = frozenset(("activ", "Activ", "ACTIV"))
+# Request headers for ISAPI calls (some devices require the User-Agent); multipart
+# requests leave Content-Type to httpx so it can add the boundary
+_MULTIPART_HEADERS = {"User-Agent": "Hikvision-ISAPI-Client/1.0"}
+_JSON_HEADERS = {"Content-Type": "application/json", **_MULTIPART_HEADERS}
+
+
+def _person_info_template(is_active: bool) -> bytes:
+    """Pre-serialized UserInfo object with %b slots for the JSON-encoded employeeNo and name."""
+    return (
+        b'{"employeeNo":%b,"name":%b,"userType":"normal","Valid":'
+        + json_codec.dumps_bytes(_PERSON_VALID_BY_ACTIVE[is_active])
+        + b',"doorRight":"1","RightPlan":'
+        + json_codec.dumps_bytes(_PERSON_RIGHTPLAN_CONST)
+        + b',"userVerifyMode":"face","localUIRight":false}'
+    )
+
+
+_PERSON_INFO_TEMPLATE_BY_ACTIVE = {True: _person_info_template(True), False: _person_info_template(False)}
+
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Device responses are small JSON; cap what is read so a misbehaving device can't make us buffer a huge body
+_MAX_RESPONSE_BYTES = 64 * 1024
+_DROPPED_RESPONSE_HEADERS = frozenset(("content-encoding", "content-length", "transfer-encoding"))
+# Retry policy for both shared clients: failed connection attempts are retried by the
+# transport (nothing was sent yet); gateway/overload statuses from a device are retried
+# with exponential backoff, but only for methods safe to repeat: a POST (Person record,
+# FaceDataRecord upload) may already have been applied behind a gateway error
+_CONNECT_RETRIES = 2
+_RETRY_STATUSES = frozenset((502, 503, 504))
+_RETRY_METHODS = frozenset(("GET", "PUT"))
+_STATUS_RETRIES = 2
+_RETRY_BACKOFF_SEC = 0.3
+# In-flight image downloads by URL, shared by every device syncing the same photo
+_image_downloads: Dict[str, "asyncio.Task"] = {}
+_SCHEME_RE = re.compile(r"(https?)://")
+_JSON_OBJECT_START_RE = re.compile(rb"\s*\{")
+# Hash of the last Person body each device accepted, per (person URL, employee_no), so an
+# unchanged record is not re-sent every sync. Opt-in (HIKVISION_PERSON_CACHE_TTL seconds,
+# default 0 = off): the cache is process-local, so a person deleted on the device out of
+# band is not recreated (nor its photo re-sent) until the entry expires.
+_PERSON_CACHE_TTL_SEC = float(os.getenv("HIKVISION_PERSON_CACHE_TTL", "0"))
+_PERSON_CACHE_MAX = 8192
+_last_synced_persons: Dict[Tuple[str, str], Tuple[int, float]] = {}
+
+# Shared client for image downloads (keep-alive/TLS session reuse across photos)
+_download_client: Optional[httpx.AsyncClient] = None
+_download_client_lock = asyncio.Lock()
+# Shared client for ISAPI calls to devices (keep-alive across persons/faces per device)
+_device_client: Optional[httpx.AsyncClient] = None
+_device_client_lock = asyncio.Lock()
+# httpx digest auth per device and credentials; keeps the last challenge between calls
+_digest_auths: Dict[Tuple[str, object, str, str], httpx.DigestAuth] = {}
+# faceURL capability per device (ip, port, model, firmware)
+_face_url_support: Dict[Tuple[object, ...], bool] = {}
+# Whether a device accepts batched {"UserInfo": [...]} Person writes, per person URL; learned
+# from the first batch sent (absent = unknown, so a batch is tried)
+_batch_person_support: Dict[str, bool] = {}
+# Comma-separated model prefixes (e.g. "DS-K1T671,DS-K1T341") known to fetch faceURL themselves
+_FACE_URL_MODEL_PREFIXES = tuple(
+    prefix.strip().upper()
+    for prefix in os.getenv("HIKVISION_FACE_URL_MODELS", "").split(",")
+    if prefix.strip()
+)
+
+
+async def _get_download_client() -> httpx.AsyncClient:
+    """Return the shared image download client, creating it on first use."""
+    global _download_client
+    if _download_client is None:
+        async with _download_client_lock:
+            if _download_client is None:
+                _download_client = httpx.AsyncClient(
+                    timeout=30.0,
+                    transport=httpx.AsyncHTTPTransport(
+                        verify=True,
+                        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                        retries=_CONNECT_RETRIES,
+                    ),
+                )
+    return _download_client
+
+
+async def _get_device_client() -> httpx.AsyncClient:
+    """Return the shared ISAPI device client, creating it on first use."""
+    global _device_client
+    if _device_client is None:
+        async with _device_client_lock:
+            if _device_client is None:
+                # Device URLs are plain http://, so this is HTTP/1.1 keep-alive (no ALPN, no HTTP/2)
+                _device_client = httpx.AsyncClient(
+                    timeout=15.0,
+                    transport=httpx.AsyncHTTPTransport(
+                        verify=False,  # Devices may use self-signed certs
+                        limits=httpx.Limits(max_keepalive_connections=32),
+                        retries=_CONNECT_RETRIES,
+                    ),
+                )
+    return _device_client
 
-async def _download_image_to_base64(image_url: str) -> str:
+
+async def _device_request(method: str, url: str, **kwargs) -> httpx.Response:
     """
-    Download image from URL and convert to base64 string.
-    
-    Args:
-        image_url: URL of the image to download
-        
-    Returns:
-        Base64-encoded string of the image data (ready for modelData field)
-        
-    Raises:
-        httpx.HTTPError: If download fails
-        Exception: If image processing fails
+    Send an ISAPI request on the shared device client and read at most
+    _MAX_RESPONSE_BYTES of the (decoded) body; the rest is discarded unread.
+    """
+    client = await _get_device_client()
+    async with client.stream(method, url, **kwargs) as response:
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) >= _MAX_RESPONSE_BYTES:
+                del body[_MAX_RESPONSE_BYTES:]
+                break
+    headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_RESPONSE_HEADERS]
+    return httpx.Response(response.status_code, headers=headers, content=bytes(body), request=response.request)
+
+
+async def aclose_http_clients():
+    """Close shared HTTP clients (call on application shutdown)."""
+    global _download_client, _device_client
+    clients = (_download_client, _device_client)
+    _download_client = _device_client = None
+    for client in clients:
+        if client is not None:
+            await client.aclose()
+
+
+class _IsapiEndpoints(NamedTuple):
+    """ISAPI URLs for one device."""
+    delete: str
+    person: str
+    face_add: str
+    face_update: str
+    device_info: str
+
+
+@lru_cache(maxsize=256)
+def _endpoints(ip: str, port) -> _IsapiEndpoints:
+    """Build (once per ip/port) the ISAPI URLs used by the sync operations."""
+    port = int(port or 0) or 80  # Default to 80 if port is missing or 0; rows may carry "" or "8000"
+    if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
+        logger.warning("Device %s: port is 8000, but ISAPI is served on port 80. Using port 80 instead.", ip)
+        port = 80
+    base = f"http://{ip}:{port}"
+    return _IsapiEndpoints(
+        delete=f"{base}/ISAPI/AccessControl/UserInfoDetail/Delete?format=json",
+        person=f"{base}/ISAPI/AccessControl/UserInfo/Record?format=json",
+        face_add=f"{base}/ISAPI/Intelligent/FDLib/FaceDataRecord?format=json",
+        face_update=f"{base}/ISAPI/Intelligent/FDLib/FDModify?format=json",
+        device_info=f"{base}/ISAPI/System/deviceInfo",
+    )
+
+
+def _device_endpoints(device: dict) -> _IsapiEndpoints:
+    """ISAPI URLs for a device dict (Supabase ip_address or legacy ip format)."""
+    return _endpoints(device.get("ip_address") or device.get("ip"), device.get("port"))
+
+
+def _device_supports_face_url(device: dict) -> bool:
+    """
+    Return True if the device can download the face photo itself from a faceURL.
+
+    When it can, the bridge sends only the (signed) URL and the device pulls the
+    image straight from Supabase Storage, so the photo never passes through this
+    server. Older firmware needs the image uploaded as multipart binary instead.
+
+    Decided from an explicit ``supports_face_url`` flag on the device row, else
+    from its ``model`` matching HIKVISION_FACE_URL_MODELS. Unknown devices keep
+    the multipart upload. Cached per device.
+    """
+    model = (device.get("model") or "").strip().upper()
+    key = (
+        device.get("ip_address") or device.get("ip"),
+        device.get("port"),
+        model,
+        device.get("firmware_version"),
+        device.get("supports_face_url"),
+    )
+    supported = _face_url_support.get(key)
+    if supported is None:
+        flag = device.get("supports_face_url")
+        if flag is not None:
+            supported = bool(flag)
+        else:
+            supported = bool(model) and model.startswith(_FACE_URL_MODEL_PREFIXES)
+        _face_url_support[key] = supported
+    return supported
+
+
+def _device_credentials(device: dict) -> Tuple[str, str]:
+    """(username, password) for both Supabase (username/password_encrypted) and legacy (user/password) devices."""
+    username = device.get("username") or device.get("user", "")
+    password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
+    return username, password
+
+
+def _credential_key(device: dict, username: str, password: str) -> Tuple[str, object, str, str]:
+    return (device.get("ip_address") or device.get("ip"), device.get("port"), username, password)
+
+
+def _device_auth(device: dict, username: str, password: str) -> httpx.DigestAuth:
+    """
+    Return the cached httpx.DigestAuth for this device and credentials.
+
+    A reused DigestAuth sends the Authorization header from the last challenge
+    (with an incremented nonce count) up front, so only the first call, or one
+    after the device rotates its nonce, pays the 401 challenge round trip.
     """
+    key = _credential_key(device, username, password)
+    auth = _digest_auths.get(key)
+    if auth is None:
+        auth = _digest_auths[key] = httpx.DigestAuth(username, password)
+    return auth
+
+
+async def _authed_request(device: dict, username: str, password: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    _device_request with the device's cached digest auth.
+
+    DigestAuth already answers a fresh challenge (e.g. a stale nonce) in-band. If a
+    401 still comes back, the cached auth is dropped and the request is sent once more
+    with a new one, here, so callers don't redo image downloads for an auth retry.
+    502/503/504 responses to GET/PUT are retried up to _STATUS_RETRIES times with
+    backoff; POSTs are not, since the device may already have applied them.
+    """
+    auth_retried = False
+    status_retries = 0
+    retry_statuses = method in _RETRY_METHODS
+    while True:
+        response = await _device_request(method, url, auth=_device_auth(device, username, password), **kwargs)
+        if response.status_code == 401 and not auth_retried:
+            auth_retried = True
+            logger.debug("401 from %s, retrying with fresh digest auth", url)
+            _digest_auths.pop(_credential_key(device, username, password), None)
+            continue
+        if retry_statuses and response.status_code in _RETRY_STATUSES and status_retries < _STATUS_RETRIES:
+            delay = _RETRY_BACKOFF_SEC * 2 ** status_retries
+            status_retries += 1
+            logger.debug("HTTP %s from %s, retrying in %.1fs", response.status_code, url, delay)
+            await asyncio.sleep(delay)
+            continue
+        return response
+
+
+async def prime_device_auth(device: dict):
+    """
+    Fetch deviceInfo once so the device's digest challenge is cached before a bulk sync.
+
+    Without it, every request of a concurrent fan-out to a device not contacted yet
+    pays its own 401 round trip. Devices already contacted are skipped; errors are
+    only logged (the sync calls will report them).
+    """
+    username, password = _device_credentials(device)
+    if _credential_key(device, username, password) in _digest_auths:
+        return
+    url = _device_endpoints(device).device_info
     try:
-        print(f"  INFO: Downloading image from URL: {image_url}")
-        async with httpx.AsyncClient(timeout=30.0, verify=True) as client:
-            response = await client.get(image_url)
-            response.raise_for_status()
-            
-            # Get image data
-            image_data = response.content
-            
-            # Convert to base64
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            
-            print(f"  INFO: Image downloaded successfully, size: {len(image_data)} bytes, base64 length: {len(base64_data)}")
-            return base64_data
-            
-    except httpx.TimeoutException as exc:
-        print(f"  ERROR: Timeout downloading image from {image_url}: {exc}")
-        raise Exception(f"Image download timeout: {exc}") from exc
+        response = await _authed_request(device, username, password, "GET", url, headers=_MULTIPART_HEADERS, timeout=10.0)
+        logger.debug("Primed digest auth for %s: HTTP %s", url, response.status_code)
     except httpx.HTTPError as exc:
-        print(f"  ERROR: HTTP error downloading image from {image_url}: {exc}")
-        raise Exception(f"Image download failed: {exc}") from exc
-    except Exception as exc:
-        print(f"  ERROR: Failed to download/process image from {image_url}: {exc}")
-        raise Exception(f"Image processing failed: {exc}") from exc
+        logger.debug("Could not prime digest auth for %s: %s", url, exc)
+
+
+def _debug_request(label: str, url: str, username: str, password: str, payload):
+    """Log an outgoing ISAPI request at DEBUG (arguments are only formatted when enabled)."""
+    logger.debug(
+        "ISAPI request (%s): url=%s username=%s password_len=%d payload=%s",
+        label, url, username, len(password), payload,
+    )
+
+
+def _debug_multipart(json_payload: bytes, image_data: "_ImageBuffer"):
+    """Log the parts of a multipart face upload at DEBUG."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Multipart parts: faceURL json=%s (%d bytes), FaceDataRecord facePic.jpg image/jpeg %d bytes, first 20 bytes=%s",
+            json_payload.decode(), len(json_payload), len(image_data), image_data.head(20).hex(),
+        )
+
+
+def _body_snippet(response, limit: int) -> str:
+    """Decode only the first limit bytes of a response body (not the whole body like .text)."""
+    return response.content[:limit].decode("utf-8", "replace")
+
 
+def _debug_response(label: str, response):
+    """Log an ISAPI response at DEBUG; the body is only decoded when enabled."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "ISAPI response (%s): status=%s headers=%s body=%s",
+            label, response.status_code, response.headers, _body_snippet(response, 500),
+        )
+
+
+class _ImageBuffer:
+    """
+    Downloaded image kept as the chunks it arrived in, without joining them.
 
-async def _download_image_binary(image_url: str) -> bytes:
+    Minimal read-only file object for httpx multipart: read() returns the next
+    chunk, and seek() supports the start and end positions. That is enough for httpx
+    to compute Content-Length and to re-send the part after a digest challenge.
+    """
+
+    def __init__(self, chunks: list):
+        self._chunks = chunks
+        self._size = sum(map(len, chunks))
+        self._index = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def copy(self) -> "_ImageBuffer":
+        """New buffer over the same chunks with its own read position."""
+        return _ImageBuffer(self._chunks)
+
+    def head(self, n: int) -> bytes:
+        """First n bytes of the image (for debug output)."""
+        out = b""
+        for chunk in self._chunks:
+            out += chunk[:n - len(out)]
+            if len(out) >= n:
+                break
+        return out
+
+    def read(self, size: int = -1) -> bytes:
+        if self._index >= len(self._chunks):
+            return b""
+        self._index += 1
+        return self._chunks[self._index - 1]
+
+    def tell(self) -> int:
+        return self._size if self._index >= len(self._chunks) else sum(map(len, self._chunks[:self._index]))
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_END and offset == 0:
+            self._index = len(self._chunks)
+        elif whence == io.SEEK_SET and offset in (0, self._size):
+            self._index = 0 if offset == 0 else len(self._chunks)
+        else:
+            raise io.UnsupportedOperation("_ImageBuffer only seeks to the start or end")
+        return self.tell()
+
+
+async def _download_image_binary(image_url: str, client: Optional[httpx.AsyncClient] = None) -> _ImageBuffer:
     """
     Download image from URL and return binary data.
     
     Args:
         image_url: URL of the image to download
+        client: Optional AsyncClient to use (defaults to the shared download client)
         
     Returns:
-        Binary image data (bytes)
+        _ImageBuffer with the image bytes, passed as-is to the multipart upload
         
     Raises:
         httpx.HTTPError: If download fails
         Exception: If image processing fails
     """
     try:
-        logger.info(f"Downloading image from URL: {image_url}")
-        async with httpx.AsyncClient(timeout=30.0, verify=True) as client:
-            response = await client.get(image_url)
+        logger.info("Downloading image from URL: %s", image_url)
+        client = client or await _get_download_client()
+        async with client.stream("GET", image_url) as response:
             response.raise_for_status()
             
-            # Get image data
-            image_data = response.content
-            
-            logger.info(f"Image downloaded successfully, size: {len(image_data)} bytes")
-            return image_data
-            
+            # Keep the received chunks; the upload streams them without another full copy
+            image_data = _ImageBuffer([chunk async for chunk in response.aiter_bytes(_DOWNLOAD_CHUNK_SIZE)])
+        
+        logger.info("Image downloaded successfully, size: %d bytes", len(image_data))
+        return image_data
+        
     except httpx.TimeoutException as exc:
-        logger.error(f"Timeout downloading image from {image_url}: {exc}")
+        logger.error("Timeout downloading image from %s: %s", image_url, exc)
         raise Exception(f"Image download timeout: {exc}") from exc
     except httpx.HTTPError as exc:
-        logger.error(f"HTTP error downloading image from {image_url}: {exc}")
+        logger.error("HTTP error downloading image from %s: %s", image_url, exc)
         raise Exception(f"Image download failed: {exc}") from exc
     except Exception as exc:
-        logger.error(f"Failed to download/process image from {image_url}: {exc}")
+        logger.error("Failed to download/process image from %s: %s", image_url, exc)
         raise Exception(f"Image processing failed: {exc}") from exc
 
 
-def _build_person_payload(angajat: dict) -> dict:
+def _forget_image_download(image_url: str, task: "asyncio.Task") -> None:
+    if _image_downloads.get(image_url) is task:
+        del _image_downloads[image_url]
+    if not task.cancelled():
+        task.exception()  # retrieved here so an unawaited failure is not reported as lost
+
+
+async def _download_image_shared(image_url: str) -> _ImageBuffer:
     """
-    Build ISAPI Person creation payload from angajat data.
-    Args:
-        angajat: Dict with angajat data including biometrie.employee_no, nume, prenume, status
-    Returns:
-        JSON payload dict for ISAPI Person creation
+    Download image_url once for all concurrent callers (one download per photo,
+    not per device). Only in-flight downloads are shared: once the download
+    finishes, the next caller fetches the URL again, so a photo replaced at the
+    same URL is never served stale.
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    
+    task = _image_downloads.get(image_url)
+    if task is None:
+        task = asyncio.ensure_future(_download_image_binary(image_url))
+        _image_downloads[image_url] = task
+        task.add_done_callback(lambda done: _forget_image_download(image_url, done))
+    # Shielded so one cancelled caller does not cancel the download for the others
+    image = await asyncio.shield(task)
+    return image.copy()
+
+
+def _extract_employee_no(angajat: dict, purpose: str = "sync") -> str:
+    """
+    Return the angajat's biometrie.employee_no as the string the device expects.
+
+    Raises:
+        ValueError: If employee_no is missing
+    """
+    employee_no = angajat.get("biometrie", {}).get("employee_no")
     if not employee_no:
-        raise ValueError("employee_no is required for sync")
+        raise ValueError(f"employee_no is required for {purpose}")
+    return str(employee_no)
+
+
+def _person_fields(angajat: dict, employee_no: Optional[str] = None) -> Tuple[str, str, bool]:
+    """
+    Resolve (employee_no, name, is_active) for a Person payload.
+
+    Raises:
+        ValueError: If employee_no is missing
+    """
+    employee_no = employee_no or _extract_employee_no(angajat)
     
     # Format name: "Nume Prenume" or fallback to nume_complet
-    nume = angajat.get("nume", "").strip()
-    prenume = angajat.get("prenume", "").strip()
+    nume = angajat.get("nume")
+    prenume = angajat.get("prenume")
+    if nume and prenume:
+        nume = nume.strip()
+        prenume = prenume.strip()
     if nume and prenume:
         name = f"{nume} {prenume}"
     else:
-        name = angajat.get("nume_complet", "").strip() or "Unknown"
-    
-    # Determine if employee is active
-    status = angajat.get("status", "").lower()
-    is_active = status == "activ"
+        name = (angajat.get("nume_complet") or "").strip() or "Unknown"
     
-    return {
-        "UserInfo": {
-            "employeeNo": str(employee_no),  # Device expects string format
-            "name": name,
-            "userType": "normal",
-            "Valid": {
-                "enable": is_active,
-                "beginTime": "2025-10-10T00:00:00",
-                "endTime": "2037-12-31T23:59:59",
-                "timeType": "local"
-            },
-            "doorRight": "1",
-            "RightPlan": [
-                {
-                    "doorNo": 1,
-                    "planTemplateNo": "1"
-                }
-            ],
-            "userVerifyMode": "face",
-            "localUIRight": False
-        }
-    }
+    # Determine if employee is active (common spellings matched without lowering)
+    status = angajat.get("status") or ""
+    return employee_no, name, status in _ACTIVE_STATUSES or status.lower() == "activ"
+
+
+def _encode_person_info(angajat: dict, employee_no: Optional[str] = None) -> bytes:
+    """
+    Serialize the ISAPI UserInfo object for one angajat from the pre-built template.
+
+    Only employeeNo and name are encoded per call; the constant blocks (userType,
+    Valid, doorRight, RightPlan, verify mode) were serialized once at import.
+    """
+    employee_no, name, is_active = _person_fields(angajat, employee_no)
+    return _PERSON_INFO_TEMPLATE_BY_ACTIVE[is_active] % (
+        json_codec.dumps_bytes(employee_no),
+        json_codec.dumps_bytes(name),
+    )
+
+
+@lru_cache(maxsize=1024)
+def _normalize_face_url(url: str, supabase_url: Optional[str], allow_filename: bool = True) -> str:
+    """
+    Normalize a faceURL for the device.
+
+    A bare filename (allowed unless the URL was already resolved) becomes a public
+    Supabase Storage URL, and http:// Supabase URLs are upgraded to https:// since
+    devices need HTTPS for external URLs.
+
+    Raises:
+        ValueError: If url is a bare filename and supabase_url is not provided
+    """
+    match = _SCHEME_RE.match(url)
+    if allow_filename and match is None:
+        if not supabase_url:
+            raise ValueError(f"foto_fata_url is just a filename ('{url}') but supabase_url not provided to construct full URL")
+        # Construct full URL: https://xxx.supabase.co/storage/v1/object/public/pontaj-photos/{filename}
+        url = f"{supabase_url}/storage/v1/object/public/pontaj-photos/{url}"
+        match = _SCHEME_RE.match(url)
+        logger.debug("Constructed full Supabase Storage URL from filename")
+    if match is not None and match.group(1) == "http" and ".supabase.co" in url:
+        url = "https://" + url[7:]
+        logger.debug("Converted HTTP to HTTPS for Supabase URL")
+    return url
+
+
+def _face_payload_fields(
+    angajat: dict,
+    supabase_url: Optional[str],
+    resolved_face_url: Optional[str],
+    employee_no: Optional[str],
+    purpose: str,
+) -> Tuple[str, str]:
+    """
+    Resolve (employee_no, faceURL) for the face image payload builders.
+
+    Raises:
+        ValueError: If employee_no or foto_fata_url is missing
+    """
+    employee_no = employee_no or _extract_employee_no(angajat, purpose)
+    foto_fata_url = resolved_face_url or angajat.get("biometrie", {}).get("foto_fata_url")
+    if not foto_fata_url:
+        raise ValueError(f"foto_fata_url is required for {purpose}")
+    return employee_no, _normalize_face_url(foto_fata_url, supabase_url, allow_filename=not resolved_face_url)
 
 
 def _build_face_image_payload(
     angajat: dict,
     supabase_url: Optional[str] = None,
     resolved_face_url: Optional[str] = None,
+    employee_no: Optional[str] = None,
 ) -> dict:
     """
     Build ISAPI Face Image payload from angajat data.
@@ -152,37 +546,16 @@ def _build_face_image_payload(
         angajat: Dict with angajat data including biometrie.employee_no and foto_fata_url
         supabase_url: Optional Supabase URL (e.g., "https://xxx.supabase.co") to construct full URL if foto_fata_url is just a filename
         resolved_face_url: If set, used as faceURL (signed URL or legacy public URL)
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         JSON payload dict for ISAPI Face Image addition
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    foto_fata_url = resolved_face_url if resolved_face_url else biometrie.get("foto_fata_url")
-    
-    if not employee_no:
-        raise ValueError("employee_no is required for face image sync")
-    if not foto_fata_url:
-        raise ValueError("foto_fata_url is required for face image sync")
-    
-    if not resolved_face_url:
-        # If foto_fata_url is just a filename (no http:// or https://), construct full Supabase Storage URL
-        if not foto_fata_url.startswith("http://") and not foto_fata_url.startswith("https://"):
-            if supabase_url:
-                # Construct full URL: https://xxx.supabase.co/storage/v1/object/public/pontaj-photos/{filename}
-                foto_fata_url = f"{supabase_url}/storage/v1/object/public/pontaj-photos/{foto_fata_url}"
-                print(f"  INFO: Constructed full Supabase Storage URL from filename")
-            else:
-                raise ValueError(f"foto_fata_url is just a filename ('{foto_fata_url}') but supabase_url not provided to construct full URL")
-    
-    # Ensure HTTPS is used for Supabase storage URLs (devices need HTTPS for external URLs)
-    if foto_fata_url.startswith("http://") and ".supabase.co" in foto_fata_url:
-        foto_fata_url = foto_fata_url.replace("http://", "https://", 1)
-        print(f"  INFO: Converted HTTP to HTTPS for Supabase URL")
-    
+    employee_no, foto_fata_url = _face_payload_fields(
+        angajat, supabase_url, resolved_face_url, employee_no, "face image sync"
+    )
     return {
-        "faceLibType": "blackFD",
-        "FDID": "1",
-        "FPID": str(employee_no),  # Numeric employee number as string
+        **_FACE_LIB_CONST,
+        "FPID": employee_no,  # Numeric employee number as string
         "faceURL": foto_fata_url
     }
 
@@ -191,6 +564,7 @@ def _build_face_image_update_payload(
     angajat: dict,
     supabase_url: Optional[str] = None,
     resolved_face_url: Optional[str] = None,
+    employee_no: Optional[str] = None,
 ) -> dict:
     """
     Build ISAPI Face Image update payload from angajat data (for PUT request).
@@ -198,107 +572,75 @@ def _build_face_image_update_payload(
         angajat: Dict with angajat data including biometrie.employee_no and foto_fata_url
         supabase_url: Optional Supabase URL (e.g., "https://xxx.supabase.co") to construct full URL if foto_fata_url is just a filename
         resolved_face_url: If set, used as faceURL (signed URL or legacy public URL)
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         JSON payload dict for ISAPI Face Image update (PUT request)
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    foto_fata_url = resolved_face_url if resolved_face_url else biometrie.get("foto_fata_url")
-    
-    if not employee_no:
-        raise ValueError("employee_no is required for face image update")
-    if not foto_fata_url:
-        raise ValueError("foto_fata_url is required for face image update")
-    
-    if not resolved_face_url:
-        # If foto_fata_url is just a filename (no http:// or https://), construct full Supabase Storage URL
-        if not foto_fata_url.startswith("http://") and not foto_fata_url.startswith("https://"):
-            if supabase_url:
-                # Construct full URL: https://xxx.supabase.co/storage/v1/object/public/pontaj-photos/{filename}
-                foto_fata_url = f"{supabase_url}/storage/v1/object/public/pontaj-photos/{foto_fata_url}"
-                print(f"  INFO: Constructed full Supabase Storage URL from filename")
-            else:
-                raise ValueError(f"foto_fata_url is just a filename ('{foto_fata_url}') but supabase_url not provided to construct full URL")
-    
-    # Ensure HTTPS is used for Supabase storage URLs (devices need HTTPS for external URLs)
-    if foto_fata_url.startswith("http://") and ".supabase.co" in foto_fata_url:
-        foto_fata_url = foto_fata_url.replace("http://", "https://", 1)
-        print(f"  INFO: Converted HTTP to HTTPS for Supabase URL")
-    
+    employee_no, foto_fata_url = _face_payload_fields(
+        angajat, supabase_url, resolved_face_url, employee_no, "face image update"
+    )
     return {
-        "faceLibType": "blackFD",
-        "FDID": "1",
-        "FPID": str(employee_no),  # Numeric employee number as string
+        **_FACE_LIB_CONST,
+        "FPID": employee_no,  # Numeric employee number as string
         "faceID": "1",  # Default face ID for update
         "faceURL": foto_fata_url
     }
 
 
-def _build_face_image_payload_with_data(angajat: dict) -> dict:
+def _build_face_image_payload_with_data(angajat: dict, employee_no: Optional[str] = None) -> dict:
     """
     Build ISAPI Face Image payload JSON part for multipart/form-data request.
     Args:
         angajat: Dict with angajat data including biometrie.employee_no
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         JSON payload dict for ISAPI Face Image addition (without image data - sent as separate part)
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    
-    if not employee_no:
-        raise ValueError("employee_no is required for face image sync")
+    employee_no = employee_no or _extract_employee_no(angajat, "face image sync")
     
     return {
-        "faceLibType": "blackFD",
-        "FDID": "1",
-        "FPID": str(employee_no),  # Numeric employee number as string
+        **_FACE_LIB_CONST,
+        "FPID": employee_no,  # Numeric employee number as string
         # Note: Image data is sent as separate multipart part, not in JSON
     }
 
 
-def _build_face_image_update_payload_with_data(angajat: dict) -> dict:
+def _build_face_image_update_payload_with_data(angajat: dict, employee_no: Optional[str] = None) -> dict:
     """
     Build ISAPI Face Image update payload JSON part for multipart/form-data request.
     Args:
         angajat: Dict with angajat data including biometrie.employee_no
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         JSON payload dict for ISAPI Face Image update (PUT request) (without image data - sent as separate part)
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    
-    if not employee_no:
-        raise ValueError("employee_no is required for face image update")
+    employee_no = employee_no or _extract_employee_no(angajat, "face image update")
     
     return {
-        "faceLibType": "blackFD",
-        "FDID": "1",
-        "FPID": str(employee_no),  # Numeric employee number as string
+        **_FACE_LIB_CONST,
+        "FPID": employee_no,  # Numeric employee number as string
         "faceID": "1",  # Default face ID for update
         # Note: Image data is sent as separate multipart part, not in JSON
     }
 
 
-def _build_delete_user_payload(angajat: dict) -> dict:
+def _build_delete_user_payload(angajat: dict, employee_no: Optional[str] = None) -> dict:
     """
     Build ISAPI User deletion payload from angajat data.
     Args:
         angajat: Dict with angajat data including biometrie.employee_no
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         JSON payload dict for ISAPI User deletion
     """
-    biometrie = angajat.get("biometrie", {})
-    employee_no = biometrie.get("employee_no")
-    
-    if not employee_no:
-        raise ValueError("employee_no is required for user deletion")
+    employee_no = employee_no or _extract_employee_no(angajat, "user deletion")
     
     return {
         "UserInfoDetail": {
             "mode": "byEmployeeNo",
             "EmployeeNoList": [
                 {
-                    "employeeNo": str(employee_no)  # Device expects string format
+                    "employeeNo": employee_no  # Device expects string format
                 }
             ],
             "operateType": "byTerminal",
@@ -307,62 +649,54 @@ def _build_delete_user_payload(angajat: dict) -> dict:
     }
 
 
-def _classify_delete_response(response) -> SyncResult:
+# (op, statusCode, subStatusCode) -> successful outcome; subStatusCode None matches any value.
+# Results with fixed messages are shared instances - callers must not mutate them.
+_CLASSIFY = {
+    ("delete", 1, "ok"): SyncResult(SyncResultStatus.SUCCESS, "User deleted successfully", "delete"),
+    # Some devices return statusCode 6 with varying subStatusCodes for "user not found" (idempotent delete)
+    ("delete", 6, None): SyncResult(
+        SyncResultStatus.SUCCESS, "User not found on device (already deleted or never existed)", "delete"
+    ),
+    ("person", 1, "ok"): SyncResult(SyncResultStatus.SUCCESS, "Person created/updated successfully", "person"),
+    # Already exists - treat as success (can be HTTP 200 or HTTP 400)
+    ("person", 6, "employeeNoAlreadyExist"): SyncResult(
+        SyncResultStatus.SUCCESS, "Person already exists on device", "person", SyncResultCode.ALREADY_EXISTS
+    ),
+}
+_RES_PERSON_UNCHANGED = SyncResult(
+    SyncResultStatus.SUCCESS,
+    "Person already exists on device (unchanged since last sync)",
+    "person",
+    SyncResultCode.ALREADY_EXISTS,
+)
+# Status for ISAPI errors not in _CLASSIFY (a failed delete is non-fatal)
+_CLASSIFY_ERROR_STATUS = {
+    "delete": SyncResultStatus.PARTIAL,
+    "person": SyncResultStatus.FATAL,
+}
+_NOT_FOUND_MARKERS = ("not found", "does not exist")
+
+
+def _json_object(response) -> Optional[dict]:
     """
-    Classify ISAPI User deletion response.
-    Returns SyncResult with status and message.
+    Decoded JSON object body, or None if the body is empty, not JSON or not an object.
+
+    The body is sniffed first (not the Content-Type, which some firmware sets to text/plain
+    for JSON), so HTML error pages and empty bodies are rejected without raising.
     """
-    # Auth failure is always fatal
-    if response.status_code == 401:
-        return SyncResult(
-            SyncResultStatus.FATAL,
-            "Authentication failed - invalid device credentials",
-            "delete"
-        )
-    
-    # Try to parse JSON body even for non-200 responses
+    content = response.content
+    if not _JSON_OBJECT_START_RE.match(content):
+        return None
     try:
-        data = response.json()
-        status_code = data.get("statusCode")
-        sub_status_code = data.get("subStatusCode", "")
-        status_string = data.get("statusString", "")
-        
-        # Success (HTTP 200) - statusCode: 1, subStatusCode: "ok"
-        if status_code == 1 and sub_status_code == "ok":
-            return SyncResult(SyncResultStatus.SUCCESS, "User deleted successfully", "delete")
-        
-        # User not found - treat as success (idempotent operation)
-        # Some devices may return different statusCodes for "user not found"
-        # Check common patterns for "not found" or "does not exist"
-        if status_code == 6 or "not found" in status_string.lower() or "does not exist" in status_string.lower():
-            return SyncResult(SyncResultStatus.SUCCESS, "User not found on device (already deleted or never existed)", "delete")
-        
-        # Other ISAPI error (even if HTTP 200, but statusCode indicates error)
-        error_msg = data.get("errorMsg", "") or status_string
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"ISAPI error: statusCode={status_code}, subStatusCode={sub_status_code}, statusString={status_string}, errorMsg={error_msg}",
-            "delete"
-        )
-    except Exception:
-        # If we can't parse JSON, treat non-200 as fatal
-        if response.status_code != 200:
-            return SyncResult(
-                SyncResultStatus.FATAL,
-                f"HTTP {response.status_code}: {response.text[:200]}",
-                "delete"
-            )
-        # HTTP 200 but couldn't parse JSON - unexpected
-        return SyncResult(
-            SyncResultStatus.FATAL,
-            f"HTTP 200 but failed to parse response: {response.text[:200]}",
-            "delete"
-        )
+        data = json_codec.loads(content)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
 
 
-def _classify_person_response(response) -> SyncResult:
+def _classify_response(op: str, response) -> SyncResult:
     """
-    Classify ISAPI Person creation response.
+    Classify an ISAPI person ("person") or user deletion ("delete") response.
     Returns SyncResult with status and message.
     """
     # Auth failure is always fatal
@@ -370,133 +704,144 @@ def _classify_person_response(response) -> SyncResult:
         return SyncResult(
             SyncResultStatus.FATAL,
             "Authentication failed - invalid device credentials",
-            "person"
+            op
         )
     
     # Try to parse JSON body even for non-200 responses
     # Some devices return HTTP 400 with "employeeNoAlreadyExist" in the body
-    try:
-        data = response.json()
-        status_code = data.get("statusCode")
-        sub_status_code = data.get("subStatusCode", "")
-        
-        # Success (HTTP 200)
-        if status_code == 1 and sub_status_code == "ok":
-            return SyncResult(SyncResultStatus.SUCCESS, "Person created/updated successfully", "person")
-        
-        # Already exists - treat as success (can be HTTP 200 or HTTP 400)
-        if status_code == 6 and sub_status_code == "employeeNoAlreadyExist":
-            return SyncResult(SyncResultStatus.SUCCESS, "Person already exists on device", "person")
-        
-        # Other ISAPI error (even if HTTP 200, but statusCode indicates error)
-        error_msg = data.get("errorMsg", "") or data.get("statusString", "")
-        return SyncResult(
-            SyncResultStatus.FATAL,
-            f"ISAPI error: statusCode={status_code}, subStatusCode={sub_status_code}, errorMsg={error_msg}",
-            "person"
-        )
-    except Exception:
+    data = _json_object(response)
+    if data is None:
         # If we can't parse JSON, treat non-200 as fatal
         if response.status_code != 200:
             return SyncResult(
                 SyncResultStatus.FATAL,
-                f"HTTP {response.status_code}: {response.text[:200]}",
-                "person"
+                f"HTTP {response.status_code}: {_body_snippet(response, 200)}",
+                op
             )
         # HTTP 200 but couldn't parse JSON - unexpected
         return SyncResult(
             SyncResultStatus.FATAL,
-            f"HTTP 200 but failed to parse response: {response.text[:200]}",
-            "person"
+            f"HTTP 200 but failed to parse response: {_body_snippet(response, 200)}",
+            op
         )
+    status_code = data.get("statusCode")
+    sub_status_code = data.get("subStatusCode", "")
+    status_string = data.get("statusString", "")
+    
+    try:
+        outcome = _CLASSIFY.get((op, status_code, sub_status_code)) or _CLASSIFY.get((op, status_code, None))
+    except TypeError:  # unhashable status fields in a malformed body
+        outcome = None
+    if outcome is None and op == "delete" and isinstance(status_string, str):
+        lowered = status_string.lower()
+        if any(marker in lowered for marker in _NOT_FOUND_MARKERS):
+            outcome = _CLASSIFY[("delete", 6, None)]
+    if outcome is not None:
+        return outcome
+    
+    # Other ISAPI error (even if HTTP 200, but statusCode indicates error)
+    error_msg = data.get("errorMsg", "") or status_string
+    if op == "delete":
+        message = (
+            f"ISAPI error: statusCode={status_code}, subStatusCode={sub_status_code}, "
+            f"statusString={status_string}, errorMsg={error_msg}"
+        )
+    else:
+        message = f"ISAPI error: statusCode={status_code}, subStatusCode={sub_status_code}, errorMsg={error_msg}"
+    return SyncResult(_CLASSIFY_ERROR_STATUS[op], message, op)
+
+
+def invalidate_synced_person(device: dict, employee_no: Optional[str] = None):
+    """
+    Forget what was last synced to device so the next create_person_on_device call is sent.
+
+    With employee_no only that person is forgotten, otherwise every person on the device.
+    """
+    url = _device_endpoints(device).person
+    if employee_no is not None:
+        _last_synced_persons.pop((url, str(employee_no)), None)
+        return
+    for key in [key for key in _last_synced_persons if key[0] == url]:
+        del _last_synced_persons[key]
+
 
+def _person_unchanged(key: Tuple[str, str], body_hash: int) -> bool:
+    cached = _last_synced_persons.get(key)
+    return cached is not None and cached[0] == body_hash and cached[1] >= time.monotonic()
 
-async def delete_user_from_device(device: dict, angajat: dict) -> SyncResult:
+
+def _remember_synced_person(key: Tuple[str, str], body_hash: int):
+    now = time.monotonic()
+    if len(_last_synced_persons) >= _PERSON_CACHE_MAX:
+        for stale in [k for k, (_, expires) in _last_synced_persons.items() if expires < now]:
+            del _last_synced_persons[stale]
+        if len(_last_synced_persons) >= _PERSON_CACHE_MAX:
+            del _last_synced_persons[next(iter(_last_synced_persons))]
+    _last_synced_persons[key] = (body_hash, now + _PERSON_CACHE_TTL_SEC)
+
+
+async def delete_user_from_device(device: dict, angajat: dict, employee_no: Optional[str] = None) -> SyncResult:
     """
     Delete user from Hikvision device via ISAPI.
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
         angajat: Angajat dict with biometrie data (must include employee_no)
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         SyncResult with status and message
     """
     try:
         # Build payload (validates employee_no exists)
-        payload = _build_delete_user_payload(angajat)
+        employee_no = employee_no or _extract_employee_no(angajat, "user deletion")
+        payload = _build_delete_user_payload(angajat, employee_no)
+        invalidate_synced_person(device, employee_no)
         
         # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            print(f"  WARNING: Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/AccessControl/UserInfoDetail/Delete?format=json"
+        url = _device_endpoints(device).delete
         
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
+        username, password = _device_credentials(device)
         
-        # Debug logging
-        print(f"DEBUG ISAPI Request (Delete User):")
-        print(f"  URL: {url}")
-        print(f"  Username: {username}")
-        print(f"  Password length: {len(password)}")
-        print(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        print(f"  Payload: {json.dumps(payload, indent=2)}")
+        _debug_request("Delete User", url, username, password, payload)
         
         # Make request with Digest Auth
         # Note: Despite endpoint name "Delete", ISAPI uses PUT method (per device docs)
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
-        
-        print(f"  Headers: {headers}")
-        
-        response = requests.put(
+        response = await _authed_request(
+            device, username, password,
+            "PUT",
             url,
-            json=payload,
-            headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
+            content=json_codec.dumps_bytes(payload),
+            headers=_JSON_HEADERS,
             timeout=15.0,
-            verify=False,  # Disable SSL verification if device uses self-signed cert
         )
         
-        print(f"DEBUG Response (Delete User):")
-        print(f"  Status: {response.status_code}")
-        print(f"  Headers: {dict(response.headers)}")
-        print(f"  Body: {response.text[:500]}")
+        _debug_response("Delete User", response)
         
-        return _classify_delete_response(response)
+        return _classify_response("delete", response)
         
     except ValueError as exc:
         # Missing employee_no - this is a validation error
-        print(f"DEBUG Validation error: {exc}")
+        logger.debug("Validation error: %s", exc)
         return SyncResult(
             SyncResultStatus.SKIPPED,
             f"Missing employee_no - cannot delete user: {exc}",
             "delete"
         )
-    except requests.exceptions.Timeout as exc:
-        print(f"DEBUG Timeout error: {exc}")
+    except httpx.TimeoutException as exc:
+        logger.debug("Timeout error: %s", exc)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Request timeout - device {device.get('ip_address')} not responding: {exc}",
             "delete"
         )
-    except requests.exceptions.ConnectionError as exc:
-        print(f"DEBUG Connection error: {exc}")
-        print(f"DEBUG Connection error type: {type(exc)}")
-        print(f"DEBUG Connection error args: {exc.args}")
+    except httpx.NetworkError as exc:
+        logger.debug("Connection error (%s): %s", type(exc).__name__, exc)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Connection error - device {device.get('ip_address')} unreachable: {exc}",
             "delete"
         )
     except Exception as exc:
-        import traceback
-        print(f"DEBUG Unexpected error: {exc}")
-        print(f"DEBUG Traceback: {traceback.format_exc()}")
+        logger.debug("Unexpected error: %s", exc, exc_info=True)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Unexpected error: {exc}",
@@ -504,84 +849,70 @@ async def delete_user_from_device(device: dict, angajat: dict) -> SyncResult:
         )
 
 
-async def create_person_on_device(device: dict, angajat: dict) -> SyncResult:
+async def create_person_on_device(device: dict, angajat: dict, employee_no: Optional[str] = None) -> SyncResult:
     """
     Create or update Person record on Hikvision device via ISAPI.
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
         angajat: Angajat dict with biometrie data
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
         SyncResult with status and message
     """
     try:
         # Build payload
-        payload = _build_person_payload(angajat)
+        employee_no = employee_no or _extract_employee_no(angajat)
+        info = _encode_person_info(angajat, employee_no)
+        body = b'{"UserInfo":%b}' % info
         
         # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            print(f"  WARNING: Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/AccessControl/UserInfo/Record?format=json"
+        url = _device_endpoints(device).person
         
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
+        # Skip the round trip when the device already accepted this exact body
+        cache_key = (url, employee_no)
+        body_hash = hash(info)
+        if _person_unchanged(cache_key, body_hash):
+            logger.debug("Person %s unchanged on %s, skipping", employee_no, url)
+            return _RES_PERSON_UNCHANGED
         
-        # Debug logging
-        print(f"DEBUG ISAPI Request:")
-        print(f"  URL: {url}")
-        print(f"  Username: {username}")
-        print(f"  Password length: {len(password)}")
-        print(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        print(f"  Payload: {json.dumps(payload, indent=2)}")
-        
-        # Make request with Digest Auth
-        # Note: Some devices may require User-Agent header
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
+        username, password = _device_credentials(device)
         
-        print(f"  Headers: {headers}")
+        if logger.isEnabledFor(logging.DEBUG):
+            _debug_request("Person", url, username, password, body.decode())
         
-        response = requests.post(
+        # Make request with Digest Auth
+        response = await _authed_request(
+            device, username, password,
+            "POST",
             url,
-            json=payload,
-            headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
+            content=body,
+            headers=_JSON_HEADERS,
             timeout=15.0,
-            verify=False,  # Disable SSL verification if device uses self-signed cert
         )
         
-        print(f"DEBUG Response:")
-        print(f"  Status: {response.status_code}")
-        print(f"  Headers: {dict(response.headers)}")
-        print(f"  Body: {response.text[:500]}")
+        _debug_response("Person", response)
         
-        return _classify_person_response(response)
+        result = _classify_response("person", response)
+        if result.status == SyncResultStatus.SUCCESS and _PERSON_CACHE_TTL_SEC > 0:
+            _remember_synced_person(cache_key, body_hash)
+        return result
         
-    except requests.exceptions.Timeout as exc:
-        print(f"DEBUG Timeout error: {exc}")
+    except httpx.TimeoutException as exc:
+        logger.debug("Timeout error: %s", exc)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Request timeout - device {device.get('ip_address')} not responding: {exc}",
             "person"
         )
-    except requests.exceptions.ConnectionError as exc:
-        print(f"DEBUG Connection error: {exc}")
-        print(f"DEBUG Connection error type: {type(exc)}")
-        print(f"DEBUG Connection error args: {exc.args}")
+    except httpx.NetworkError as exc:
+        logger.debug("Connection error (%s): %s", type(exc).__name__, exc)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Connection error - device {device.get('ip_address')} unreachable: {exc}",
             "person"
         )
     except Exception as exc:
-        import traceback
-        print(f"DEBUG Unexpected error: {exc}")
-        print(f"DEBUG Traceback: {traceback.format_exc()}")
+        logger.debug("Unexpected error: %s", exc, exc_info=True)
         return SyncResult(
             SyncResultStatus.FATAL,
             f"Unexpected error: {exc}",
@@ -589,249 +920,322 @@ async def create_person_on_device(device: dict, angajat: dict) -> SyncResult:
         )
 
 
-async def add_face_image_to_device(device: dict, angajat: dict, supabase_url: Optional[str] = None) -> SyncResult:
+def _classify_batch_person_response(response, employee_nos: list) -> Optional[Dict[str, SyncResult]]:
     """
-    Add face image to Person on Hikvision device via ISAPI.
+    Map a batched Person response to a result per employeeNo.
+
+    Devices report only the failed records, in UserInfoOutList.UserInfoOut; every other
+    record in the batch was accepted. Returns None when the device rejected the batch
+    as a whole (e.g. firmware without array support), so the caller can send singly.
+    """
+    data = _json_object(response)
+    if data is None:
+        return None
+    out_list = data.get("UserInfoOutList") or {}
+    if not isinstance(out_list, dict):
+        return None
+    failures = out_list.get("UserInfoOut") or []
+    if isinstance(failures, dict):  # some firmwares send a lone failure as an object
+        failures = [failures]
+    elif not isinstance(failures, list):
+        return None
+    entries = [failure for failure in failures if isinstance(failure, dict)]
+    if failures and not entries:  # only unrecognised entries: let the caller send singly
+        return None
+    status_code = data.get("statusCode")
+    if not entries and status_code != 1:
+        return None
+    success = _CLASSIFY[("person", 1, "ok")]
+    results = dict.fromkeys(employee_nos, success)
+    for failure in entries:
+        employee_no = str(failure.get("employeeNo"))
+        if employee_no not in results:
+            continue
+        sub_status_code = failure.get("subStatusCode", "")
+        results[employee_no] = _CLASSIFY.get(("person", failure.get("statusCode"), sub_status_code)) or SyncResult(
+            SyncResultStatus.FATAL,
+            f"ISAPI error: statusCode={failure.get('statusCode')}, subStatusCode={sub_status_code}, "
+            f"errorMsg={failure.get('errorMsg', '')}",
+            "person"
+        )
+    return results
+
+
+async def create_persons_on_device(device: dict, angajati: list, batch_size: int = 50) -> list:
+    """
+    Create or update many Person records on one device, batch_size per ISAPI request.
+
+    Sends {"UserInfo": [...]} arrays to the Person endpoint, so N persons cost
+    ceil(N / batch_size) digest-authenticated requests instead of N. Batches the
+    device rejects as a whole are resent one person at a time, and later calls for
+    that device skip straight to single requests. Persons unchanged
+    since the last sync are skipped as in create_person_on_device.
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
-        angajat: Angajat dict with biometrie data including foto_fata_url
-        supabase_url: Optional Supabase URL to construct full image URL if foto_fata_url is just a filename
+        angajati: Angajat dicts with biometrie data
+        batch_size: Maximum persons per request
     Returns:
-        SyncResult with status and message (non-fatal errors return PARTIAL status)
+        List of SyncResult, one per angajat in input order
     """
+    results: list = [None] * len(angajati)
+    url = _device_endpoints(device).person
+    pending = []  # (index, angajat, employee_no, info)
+    for index, angajat in enumerate(angajati):
+        try:
+            employee_no = _extract_employee_no(angajat)
+            info = _encode_person_info(angajat, employee_no)
+        except Exception as exc:
+            results[index] = SyncResult(SyncResultStatus.FATAL, f"Unexpected error: {exc}", "person")
+            continue
+        if _person_unchanged((url, employee_no), hash(info)):
+            results[index] = _RES_PERSON_UNCHANGED
+        else:
+            pending.append((index, angajat, employee_no, info))
+
+    username, password = _device_credentials(device)
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        if len(chunk) == 1 or _batch_person_support.get(url) is False:
+            for index, angajat, employee_no, _ in chunk:
+                results[index] = await create_person_on_device(device, angajat, employee_no=employee_no)
+            continue
+
+        body = b'{"UserInfo":[%b]}' % b",".join(info for _, _, _, info in chunk)
+        if logger.isEnabledFor(logging.DEBUG):
+            _debug_request(f"Person batch x{len(chunk)}", url, username, password, body.decode())
+        try:
+            response = await _authed_request(
+                device, username, password,
+                "POST",
+                url,
+                content=body,
+                headers=_JSON_HEADERS,
+                timeout=30.0,
+            )
+        except (httpx.TimeoutException, httpx.NetworkError) as exc:
+            logger.debug("Person batch transport error (%s): %s", type(exc).__name__, exc)
+            failed = SyncResult(
+                SyncResultStatus.FATAL,
+                f"Connection error - device {device.get('ip_address')} unreachable: {exc}",
+                "person"
+            )
+            for index, _, _, _ in chunk:
+                results[index] = failed
+            continue
+        _debug_response("Person batch", response)
+
+        employee_nos = [employee_no for _, _, employee_no, _ in chunk]
+        if response.status_code == 401:
+            batch_results = dict.fromkeys(employee_nos, _classify_response("person", response))
+        else:
+            batch_results = _classify_batch_person_response(response, employee_nos)
+        if batch_results is None:
+            logger.info("Device %s rejected a batched Person request, sending singly from now on", url)
+            _batch_person_support[url] = False
+            for index, angajat, employee_no, _ in chunk:
+                results[index] = await create_person_on_device(device, angajat, employee_no=employee_no)
+            continue
+        if response.status_code != 401:
+            _batch_person_support[url] = True
+        for index, _, employee_no, info in chunk:
+            result = results[index] = batch_results[employee_no]
+            if result.status == SyncResultStatus.SUCCESS and _PERSON_CACHE_TTL_SEC > 0:
+                _remember_synced_person((url, employee_no), hash(info))
+    return results
+
+
+# (op, statusCode, subStatusCode) -> shared success result for face add ("add") / update ("update") responses
+_FACE_CLASSIFY = {
+    ("add", 1, "ok"): SyncResult(SyncResultStatus.SUCCESS, "Face image added successfully", "photo"),
+    # Face already exists - treat as success (can be HTTP 200 or HTTP 400)
+    ("add", 6, "deviceUserAlreadyExistFace"): SyncResult(
+        SyncResultStatus.SUCCESS, "Face image already exists on device", "photo", SyncResultCode.ALREADY_EXISTS
+    ),
+    ("update", 1, "ok"): SyncResult(SyncResultStatus.SUCCESS, "Face image updated successfully (PUT)", "photo"),
+}
+_RES_FACE_EXISTS_PUT = SyncResult(
+    SyncResultStatus.SUCCESS, "Face image already exists on device (PUT)", "photo", SyncResultCode.ALREADY_EXISTS
+)
+# op -> (method, _IsapiEndpoints field, failure message prefix)
+_FACE_OPS = {
+    "add": ("POST", "face_add", "Face image failed"),
+    "update": ("PUT", "face_update", "Face image update failed"),
+}
+
+
+def _interpret_face_response(op: str, response) -> SyncResult:
+    """
+    Classify an ISAPI face add ("add") or update ("update") response.
+    Face failures are non-fatal: errors return PARTIAL (updates can fall back to POST).
+    """
+    prefix = _FACE_OPS[op][2]
+    # Try to parse JSON body even for non-200 responses
+    # Some devices return HTTP 400 with "deviceUserAlreadyExistFace" or other details in the body
+    data = _json_object(response)
+    if data is not None:
+        try:
+            status_code = data.get("statusCode")
+            status_string = data.get("statusString", "")
+            sub_status = data.get("subStatusCode", "")
+
+            result = _FACE_CLASSIFY.get((op, status_code, sub_status))
+            if result is None and op == "update":
+                if status_code == 1 and status_string.lower() == "ok":
+                    result = _FACE_CLASSIFY[("update", 1, "ok")]
+                # Check for "face already exists" type errors - treat as success for PUT
+                # (If face exists, PUT should update it, but some devices might return this)
+                elif status_code == 6 and ("alreadyExist" in sub_status or "alreadyExist" in status_string):
+                    result = _RES_FACE_EXISTS_PUT
+            if result is not None:
+                return result
+
+            # Other ISAPI error
+            error_msg = data.get("errorMsg", "") or status_string
+            if op == "update":
+                detail = f"statusCode={status_code}, subStatusCode={sub_status}, statusString={status_string}, errorMsg={error_msg}"
+            else:
+                detail = f"statusCode={status_code}, subStatusCode={sub_status}, errorMsg={error_msg}"
+            return SyncResult(SyncResultStatus.PARTIAL, f"{prefix}: {detail}", "photo")
+        except (AttributeError, TypeError):  # malformed status fields
+            pass
+
+    # No usable JSON body - judge by HTTP status
+    if response.status_code == 200:
+        return _FACE_CLASSIFY[(op, 1, "ok")]
+    return SyncResult(
+        SyncResultStatus.PARTIAL,
+        f"{prefix}: HTTP {response.status_code} - {_body_snippet(response, 200)}",
+        "photo"
+    )
+
+
+async def _do_face_call(
+    device: dict,
+    op: str,
+    payload: dict,
+    label: str,
+    image_data: Optional[_ImageBuffer] = None,
+) -> SyncResult:
+    """
+    Send a face add/update to the device and classify the response.
+
+    Without image_data the payload is sent as JSON (the device fetches faceURL itself);
+    with image_data it is sent as multipart/form-data with the image as a separate part.
+    Transport errors are returned as PARTIAL results.
+    """
+    method, endpoint, _ = _FACE_OPS[op]
+    url = getattr(_device_endpoints(device), endpoint)
+    username, password = _device_credentials(device)
+    _debug_request(label, url, username, password, payload)
+
+    if image_data is None:
+        headers = _JSON_HEADERS
+        body = {"content": json_codec.dumps_bytes(payload)}
+    else:
+        # Hikvision is case-sensitive for part names - use "FaceDataRecord" for image part
+        json_payload = json_codec.dumps_bytes(payload)
+        _debug_multipart(json_payload, image_data)
+        headers = _MULTIPART_HEADERS
+        body = {"files": {
+            'faceURL': (None, json_payload, 'application/json'),
+            'FaceDataRecord': ('facePic.jpg', image_data, 'image/jpeg')
+        }}
+
     try:
-        # Build payload
-        payload = _build_face_image_payload(angajat, supabase_url)
-        
-        # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            print(f"  WARNING: Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/Intelligent/FDLib/FaceDataRecord?format=json"
-        
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
-        
-        # Debug logging
-        print("DEBUG ISAPI Request (Face):")
-        print(f"  Device URL: {url}")
-        print(f"  Username: {username}")
-        print(f"  Password length: {len(password)}")
-        print(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        print(f"  Face Image URL (faceURL): {payload.get('faceURL', 'N/A')}")
-        print(f"  Payload: {json.dumps(payload, indent=2)}")
-        
-        # Make request with Digest Auth
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
-        print(f"  Headers: {headers}")
-        
-        response = requests.post(
+        response = await _authed_request(
+            device, username, password,
+            method,
             url,
-            json=payload,
             headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
             timeout=15.0,
+            **body,
         )
-        
-        print("DEBUG Response (Face):")
-        print(f"  Status: {response.status_code}")
-        print(f"  Headers: {dict(response.headers)}")
-        print(f"  Body: {response.text[:500]}")
-        
-        # Try to parse JSON body even for non-200 responses
-        # Some devices return HTTP 400 with "deviceUserAlreadyExistFace" in the body
-        try:
-            data = response.json()
-            status_code = data.get("statusCode")
-            sub_status_code = data.get("subStatusCode", "")
-            
-            # Success (HTTP 200)
-            if status_code == 1 and sub_status_code == "ok":
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image added successfully", "photo")
-            
-            # Face already exists - treat as success (can be HTTP 200 or HTTP 400)
-            if status_code == 6 and sub_status_code == "deviceUserAlreadyExistFace":
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image already exists on device", "photo")
-            
-            # Other ISAPI error
-            error_msg = data.get("errorMsg", "") or data.get("statusString", "")
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                f"Face image failed: statusCode={status_code}, subStatusCode={sub_status_code}, errorMsg={error_msg}",
-                "photo"
-            )
-        except Exception:
-            # If we can't parse JSON, check HTTP status
-            if response.status_code == 200:
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image added successfully", "photo")
-            else:
-                # Photo failure is non-fatal (partial success)
-                return SyncResult(
-                    SyncResultStatus.PARTIAL,
-                    f"Face image failed: HTTP {response.status_code} - {response.text[:200]}",
-                    "photo"
-                )
-        
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return SyncResult(
             SyncResultStatus.PARTIAL,
             f"Request timeout - device {device.get('ip_address')} not responding",
             "photo"
         )
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         return SyncResult(
             SyncResultStatus.PARTIAL,
             f"Connection error - device {device.get('ip_address')} unreachable",
             "photo"
         )
-    except Exception as exc:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Unexpected error: {exc}",
-            "photo"
-        )
 
+    _debug_response(label, response)
+    return _interpret_face_response(op, response)
 
-async def update_face_image_to_device(device: dict, angajat: dict, supabase_url: Optional[str] = None) -> SyncResult:
-    """
-    Update face image on Hikvision device via ISAPI (PUT), fallback-ready.
 
+async def add_face_image_to_device(
+    device: dict,
+    angajat: dict,
+    supabase_url: Optional[str] = None,
+    resolved_face_url: Optional[str] = None,
+    employee_no: Optional[str] = None,
+) -> SyncResult:
+    """
+    Add face image to Person on Hikvision device via ISAPI.
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
         angajat: Angajat dict with biometrie data including foto_fata_url
         supabase_url: Optional Supabase URL to construct full image URL if foto_fata_url is just a filename
-
+        resolved_face_url: If set, sent as faceURL instead of biometrie.foto_fata_url
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
-        SyncResult with status and message (errors are PARTIAL to allow POST fallback)
+        SyncResult with status and message (non-fatal errors return PARTIAL status)
     """
     try:
-        # Build payload (includes faceID field)
-        payload = _build_face_image_update_payload(angajat, supabase_url)
-
-        # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            print(f"  WARNING: Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/Intelligent/FDLib/FDModify?format=json"
-
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
-
-        # Debug logging
-        print("DEBUG ISAPI Request (Face Update - PUT):")
-        print(f"  Device URL: {url}")
-        print(f"  Username: {username}")
-        print(f"  Password length: {len(password)}")
-        print(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        print(f"  Face Image URL (faceURL): {payload.get('faceURL', 'N/A')}")
-        print(f"  Payload: {json.dumps(payload, indent=2)}")
-
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
-        print(f"  Headers: {headers}")
-
-        response = requests.put(
-            url,
-            json=payload,
-            headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
-            timeout=15.0,
-        )
-
-        print("DEBUG Response (Face Update - PUT):")
-        print(f"  Status: {response.status_code}")
-        print(f"  Headers: {dict(response.headers)}")
-        print(f"  Body: {response.text[:500]}")
-
-        # Try to parse JSON body even for non-200 responses
-        # Some devices return HTTP 400 with error details in JSON
-        try:
-            data = response.json()
-            status_code = data.get("statusCode")
-            status_string = data.get("statusString", "")
-            sub_status = data.get("subStatusCode", "")
-            
-            # Success (HTTP 200)
-            if status_code == 1 and (sub_status == "ok" or status_string.lower() == "ok"):
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image updated successfully (PUT)", "photo")
-            
-            # Check for "face already exists" type errors - treat as success for PUT
-            # (If face exists, PUT should update it, but some devices might return this)
-            if status_code == 6 and ("alreadyExist" in sub_status or "alreadyExist" in status_string):
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image already exists on device (PUT)", "photo")
-            
-            # Other ISAPI error - treat as partial to allow fallback
-            error_msg = data.get("errorMsg", "") or status_string
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                f"Face image update failed: statusCode={status_code}, subStatusCode={sub_status}, statusString={status_string}, errorMsg={error_msg}",
-                "photo"
-            )
-        except Exception as exc:
-            # If we can't parse JSON, check HTTP status
-            if response.status_code == 200:
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image updated successfully (PUT)", "photo")
-            else:
-                # Non-200 HTTP codes - partial to allow fallback
-                return SyncResult(
-                    SyncResultStatus.PARTIAL,
-                    f"Face image update failed: HTTP {response.status_code} - {response.text[:200]}",
-                    "photo"
-                )
-
-    except requests.exceptions.Timeout:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Request timeout - device {device.get('ip_address')} not responding",
-            "photo"
-        )
-    except requests.exceptions.ConnectionError:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Connection error - device {device.get('ip_address')} unreachable",
-            "photo"
-        )
+        payload = _build_face_image_payload(angajat, supabase_url, resolved_face_url, employee_no)
+        return await _do_face_call(device, "add", payload, "Face")
     except Exception as exc:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Unexpected error: {exc}",
-            "photo"
-        )
+        return SyncResult(SyncResultStatus.PARTIAL, f"Unexpected error: {exc}", "photo")
 
 
-async def add_face_image_to_device_with_data(
+async def update_face_image_to_device(
     device: dict,
     angajat: dict,
     supabase_url: Optional[str] = None,
-    photo_request: Optional[dict] = None,
-    photo_config: Optional[PhotoResolutionConfig] = None,
+    resolved_face_url: Optional[str] = None,
+    employee_no: Optional[str] = None,
 ) -> SyncResult:
     """
-    Add face image to Person on Hikvision device via ISAPI using direct image data (base64).
+    Update face image on Hikvision device via ISAPI (PUT), fallback-ready.
+
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
         angajat: Angajat dict with biometrie data including foto_fata_url
         supabase_url: Optional Supabase URL to construct full image URL if foto_fata_url is just a filename
-        photo_request: Optional foto_fata_signed_url / photo_resolver from bridge HTTP body
-        photo_config: Supabase base URL + edge API key (+ optional anon) for signed/callback resolution
+        resolved_face_url: If set, sent as faceURL instead of biometrie.foto_fata_url
+        employee_no: Already validated employee number (from _extract_employee_no)
+
     Returns:
-        SyncResult with status and message (non-fatal errors return PARTIAL status)
+        SyncResult with status and message (errors are PARTIAL to allow POST fallback)
     """
-    logger.info("=== Starting add_face_image_to_device_with_data ===")
     try:
-        biometrie = angajat.get("biometrie", {})
-        employee_no = biometrie.get("employee_no")
+        payload = _build_face_image_update_payload(angajat, supabase_url, resolved_face_url, employee_no)
+        return await _do_face_call(device, "update", payload, "Face Update - PUT")
+    except Exception as exc:
+        return SyncResult(SyncResultStatus.PARTIAL, f"Unexpected error: {exc}", "photo")
+
+
+async def _face_with_data(
+    op: str,
+    device: dict,
+    angajat: dict,
+    supabase_url: Optional[str],
+    photo_request: Optional[dict],
+    photo_config: Optional[PhotoResolutionConfig],
+    employee_no: Optional[str],
+) -> SyncResult:
+    """
+    Shared body of add/update_face_image_to_device_with_data: resolve the photo URL,
+    then either hand it to a faceURL-capable device or download it and upload multipart.
+    """
+    try:
+        employee_no = employee_no or _extract_employee_no(
+            angajat, "face image sync" if op == "add" else "face image update"
+        )
         cfg = photo_config or PhotoResolutionConfig(
             supabase_url=(supabase_url or "").strip(),
             edge_api_key="",
@@ -844,10 +1248,12 @@ async def add_face_image_to_device_with_data(
             )
 
         if not has_face_photo_source(angajat, photo_request):
-            logger.warning("Missing face photo source (foto_fata_url, foto_fata_signed_url, or photo_resolver callback)")
+            if op == "add":
+                logger.warning("Missing face photo source (foto_fata_url, foto_fata_signed_url, or photo_resolver callback)")
             return SyncResult(
                 SyncResultStatus.SKIPPED,
-                "Missing foto_fata_url - cannot sync photo without photo URL",
+                "Missing foto_fata_url - cannot sync photo without photo URL" if op == "add"
+                else "Missing foto_fata_url - cannot update photo without photo URL",
                 "photo",
             )
 
@@ -862,12 +1268,15 @@ async def add_face_image_to_device_with_data(
         log_url = resolved_url if len(resolved_url) <= 160 else resolved_url[:120] + "..."
         logger.info("Employee No: %s, resolved download URL: %s", employee_no, log_url)
 
-        logger.info("Downloading image from: %s", resolved_url)
+        if _device_supports_face_url(device):
+            logger.info("Device fetches faceURL itself - skipping image download")
+            fallback = add_face_image_to_device if op == "add" else update_face_image_to_device
+            return await fallback(device, angajat, supabase_url, resolved_face_url=resolved_url, employee_no=employee_no)
+
         try:
-            image_data = await _download_image_binary(resolved_url)
-            logger.info(f"Image downloaded successfully, size: {len(image_data)} bytes")
+            image_data = await _download_image_shared(resolved_url)
         except Exception as download_exc:
-            logger.error(f"Failed to download image: {download_exc}")
+            logger.error("Failed to download image: %s", download_exc)
             return SyncResult(
                 SyncResultStatus.PARTIAL,
                 f"Failed to download image: {download_exc}",
@@ -875,111 +1284,14 @@ async def add_face_image_to_device_with_data(
             )
 
         # Build JSON payload (without image data - sent as separate multipart part)
-        payload = _build_face_image_payload_with_data(angajat)
-        
-        # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            logger.warning("Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/Intelligent/FDLib/FaceDataRecord?format=json"
-        
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
-        
-        # Debug logging
-        logger.info("DEBUG ISAPI Request (Face - Multipart Form Data):")
-        logger.info(f"  Device URL: {url}")
-        logger.info(f"  Username: {username}")
-        logger.info(f"  Password length: {len(password)}")
-        logger.info(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        logger.info(f"  Image URL (downloaded from): {resolved_url}")
-        logger.info(f"  Image size: {len(image_data)} bytes")
-        logger.info(f"  JSON Payload: {json.dumps(payload, indent=2)}")
-        
-        # Prepare multipart/form-data
-        # Hikvision is case-sensitive for part names - use "FaceDataRecord" for image part
-        json_payload_str = json.dumps(payload)
-        files = {
-            'faceURL': (None, json_payload_str, 'application/json'),
-            'FaceDataRecord': ('facePic.jpg', image_data, 'image/jpeg')
-        }
-        
-        # Debug logging for multipart request
-        logger.info("DEBUG Multipart Request Details:")
-        logger.info(f"  JSON Payload (faceURL parameter): {json_payload_str}")
-        logger.info(f"  JSON Payload length: {len(json_payload_str)} bytes")
-        logger.info(f"Multipart image filename: facePic.jpg")
-        logger.info(f"Multipart image content-type: image/jpeg")
-        logger.info(f"  Image file size: {len(image_data)} bytes")
-        logger.info(f"  Image file first 20 bytes (hex): {image_data[:20].hex()}")
-        logger.info(f"  Total multipart size (approx): {len(json_payload_str) + len(image_data)} bytes")
-        logger.info(f"  Multipart files dict: {list(files.keys())}")
-        
-        # Make request with Digest Auth using multipart/form-data
-        headers = {
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
-        logger.info(f"  Request Headers: {headers}")
-        logger.info(f"  Using multipart/form-data format")
-        logger.info(f"  Sending POST request to: {url}")
-        
-        # 1️⃣ Confirm image bytes are really there
-        logger.info(f"FINAL image bytes length: {len(image_data)}")
-        logger.info(f"FINAL image first 20 bytes: {image_data[:20].hex()}")
-        
-        response = requests.post(
-            url,
-            files=files,
-            headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
-            timeout=15.0,
-        )
-        
-        logger.info("DEBUG Response (Face - Multipart Form Data):")
-        logger.info(f"  Status Code: {response.status_code}")
-        logger.info(f"  Response Headers: {dict(response.headers)}")
-        logger.info(f"  Response Content-Type: {response.headers.get('Content-Type', 'N/A')}")
-        logger.info(f"  Response Content-Length: {response.headers.get('Content-Length', 'N/A')}")
-        logger.info(f"  Response Body (first 1000 chars): {response.text[:1000]}")
-        logger.info(f"  Response Body (full length): {len(response.text)} characters")
-        
-        # Try to parse JSON body even for non-200 responses
-        # Some devices return HTTP 400 with "deviceUserAlreadyExistFace" in the body
-        try:
-            data = response.json()
-            status_code = data.get("statusCode")
-            sub_status_code = data.get("subStatusCode", "")
-            
-            # Success (HTTP 200)
-            if status_code == 1 and sub_status_code == "ok":
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image added successfully", "photo")
-            
-            # Face already exists - treat as success (can be HTTP 200 or HTTP 400)
-            if status_code == 6 and sub_status_code == "deviceUserAlreadyExistFace":
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image already exists on device", "photo")
-            
-            # Other ISAPI error
-            error_msg = data.get("errorMsg", "") or data.get("statusString", "")
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                f"Face image failed: statusCode={status_code}, subStatusCode={sub_status_code}, errorMsg={error_msg}",
-                "photo"
-            )
-        except Exception:
-            # If we can't parse JSON, check HTTP status
-            if response.status_code == 200:
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image added successfully", "photo")
-            else:
-                # Photo failure is non-fatal (partial success)
-                return SyncResult(
-                    SyncResultStatus.PARTIAL,
-                    f"Face image failed: HTTP {response.status_code} - {response.text[:200]}",
-                    "photo"
-                )
-        
+        if op == "add":
+            payload = _build_face_image_payload_with_data(angajat, employee_no)
+            label = "Face - Multipart Form Data"
+        else:
+            payload = _build_face_image_update_payload_with_data(angajat, employee_no)
+            label = "Face Update - PUT - Multipart Form Data"
+        return await _do_face_call(device, op, payload, label, image_data=image_data)
+
     except ValueError as exc:
         # Missing employee_no or model_data validation error
         return SyncResult(
@@ -987,18 +1299,6 @@ async def add_face_image_to_device_with_data(
             f"Validation error: {exc}",
             "photo"
         )
-    except requests.exceptions.Timeout:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Request timeout - device {device.get('ip_address')} not responding",
-            "photo"
-        )
-    except requests.exceptions.ConnectionError:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Connection error - device {device.get('ip_address')} unreachable",
-            "photo"
-        )
     except Exception as exc:
         return SyncResult(
             SyncResultStatus.PARTIAL,
@@ -1007,199 +1307,57 @@ async def add_face_image_to_device_with_data(
         )
 
 
-async def update_face_image_to_device_with_data(
+async def add_face_image_to_device_with_data(
     device: dict,
     angajat: dict,
     supabase_url: Optional[str] = None,
     photo_request: Optional[dict] = None,
     photo_config: Optional[PhotoResolutionConfig] = None,
+    employee_no: Optional[str] = None,
 ) -> SyncResult:
     """
-    Update face image on Hikvision device via ISAPI (PUT) using direct image data (base64), fallback-ready.
+    Add face image to Person on Hikvision device via ISAPI using direct image data (multipart binary).
 
+    Devices that can fetch faceURL themselves (see _device_supports_face_url) get
+    the resolved URL instead, and the image is not downloaded here.
     Args:
         device: Device dict with ip_address, port, username, password_encrypted
         angajat: Angajat dict with biometrie data including foto_fata_url
         supabase_url: Optional Supabase URL to construct full image URL if foto_fata_url is just a filename
         photo_request: Optional foto_fata_signed_url / photo_resolver from bridge HTTP body
         photo_config: Supabase base URL + edge API key (+ optional anon) for signed/callback resolution
-
+        employee_no: Already validated employee number (from _extract_employee_no)
     Returns:
-        SyncResult with status and message (errors are PARTIAL to allow POST fallback)
+        SyncResult with status and message (non-fatal errors return PARTIAL status)
     """
-    try:
-        cfg = photo_config or PhotoResolutionConfig(
-            supabase_url=(supabase_url or "").strip(),
-            edge_api_key="",
-        )
-        if not cfg.supabase_url.strip() and supabase_url:
-            cfg = PhotoResolutionConfig(
-                supabase_url=(supabase_url or "").strip(),
-                edge_api_key=cfg.edge_api_key,
-                anon_key=cfg.anon_key,
-            )
-
-        if not has_face_photo_source(angajat, photo_request):
-            return SyncResult(
-                SyncResultStatus.SKIPPED,
-                "Missing foto_fata_url - cannot update photo without photo URL",
-                "photo",
-            )
-
-        resolved_url = await resolve_downloadable_face_url(photo_request, angajat, cfg)
-        if not resolved_url:
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                "Could not resolve a downloadable photo URL",
-                "photo",
-            )
-
-        try:
-            image_data = await _download_image_binary(resolved_url)
-        except Exception as download_exc:
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                f"Failed to download image: {download_exc}",
-                "photo",
-            )
-
-        # Build JSON payload (without image data - sent as separate multipart part)
-        payload = _build_face_image_update_payload_with_data(angajat)
-
-        # Build URL - handle both Supabase format (ip_address) and legacy format (ip)
-        ip = device.get("ip_address") or device.get("ip")
-        port = device.get("port") or 80  # Default to 80 if port is None or 0
-        if port == 8000:  # Likely wrong port - Hikvision devices typically use 80
-            print(f"  WARNING: Port is 8000, but device info endpoint works on port 80. Using port 80 instead.")
-            port = 80
-        url = f"http://{ip}:{port}/ISAPI/Intelligent/FDLib/FDModify?format=json"
-
-        # Handle both Supabase format (username/password_encrypted) and legacy format (user/password)
-        username = device.get("username") or device.get("user", "")
-        password = device.get("password_encrypted") or device.get("password", "")  # Note: despite name, this is plain password
-
-        # Debug logging
-        print("DEBUG ISAPI Request (Face Update - PUT - Multipart Form Data):")
-        print(f"  Device URL: {url}")
-        print(f"  Username: {username}")
-        print(f"  Password length: {len(password)}")
-        print(f"  Password (first 3 chars): {password[:3] if password else 'None'}...")
-        print(f"  Image URL (downloaded from): {resolved_url}")
-        print(f"  Image size: {len(image_data)} bytes")
-        print(f"  JSON Payload: {json.dumps(payload, indent=2)}")
-
-        # Prepare multipart/form-data
-        # Hikvision is case-sensitive for part names - use "FaceDataRecord" for image part
-        json_payload_str = json.dumps(payload)
-        files = {
-            'faceURL': (None, json_payload_str, 'application/json'),
-            'FaceDataRecord': ('facePic.jpg', image_data, 'image/jpeg')
-        }
-
-        # Debug logging for multipart request
-        logger.info("DEBUG Multipart Request Details:")
-        logger.info(f"  JSON Payload (faceURL parameter): {json_payload_str}")
-        logger.info(f"  JSON Payload length: {len(json_payload_str)} bytes")
-        logger.info(f"Multipart image filename: facePic.jpg")
-        logger.info(f"Multipart image content-type: image/jpeg")
-        logger.info(f"  Image file size: {len(image_data)} bytes")
-        logger.info(f"  Image file first 20 bytes (hex): {image_data[:20].hex()}")
-        logger.info(f"  Total multipart size (approx): {len(json_payload_str) + len(image_data)} bytes")
-        logger.info(f"  Multipart files dict: {list(files.keys())}")
-
-        # Make request with Digest Auth using multipart/form-data
-        headers = {
-            "User-Agent": "Hikvision-ISAPI-Client/1.0",
-        }
-        logger.info(f"  Request Headers: {headers}")
-        logger.info(f"  Using multipart/form-data format")
-        logger.info(f"  Sending PUT request to: {url}")
-        
-        # 1️⃣ Confirm image bytes are really there
-        logger.info(f"FINAL image bytes length: {len(image_data)}")
-        logger.info(f"FINAL image first 20 bytes: {image_data[:20].hex()}")
-        
-        response = requests.put(
-            url,
-            files=files,
-            headers=headers,
-            auth=requests.auth.HTTPDigestAuth(username, password),
-            timeout=15.0,
-        )
+    logger.debug("=== Starting add_face_image_to_device_with_data ===")
+    return await _face_with_data("add", device, angajat, supabase_url, photo_request, photo_config, employee_no)
 
-        logger.info("DEBUG Response (Face Update - PUT - Multipart Form Data):")
-        logger.info(f"  Status Code: {response.status_code}")
-        logger.info(f"  Response Headers: {dict(response.headers)}")
-        logger.info(f"  Response Content-Type: {response.headers.get('Content-Type', 'N/A')}")
-        logger.info(f"  Response Content-Length: {response.headers.get('Content-Length', 'N/A')}")
-        logger.info(f"  Response Body (first 1000 chars): {response.text[:1000]}")
-        logger.info(f"  Response Body (full length): {len(response.text)} characters")
 
-        # Try to parse JSON body even for non-200 responses
-        # Some devices return HTTP 400 with error details in JSON
-        try:
-            data = response.json()
-            status_code = data.get("statusCode")
-            status_string = data.get("statusString", "")
-            sub_status = data.get("subStatusCode", "")
-            
-            # Success (HTTP 200)
-            if status_code == 1 and (sub_status == "ok" or status_string.lower() == "ok"):
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image updated successfully (PUT)", "photo")
-            
-            # Check for "face already exists" type errors - treat as success for PUT
-            # (If face exists, PUT should update it, but some devices might return this)
-            if status_code == 6 and ("alreadyExist" in sub_status or "alreadyExist" in status_string):
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image already exists on device (PUT)", "photo")
-            
-            # Other ISAPI error - treat as partial to allow fallback
-            error_msg = data.get("errorMsg", "") or status_string
-            return SyncResult(
-                SyncResultStatus.PARTIAL,
-                f"Face image update failed: statusCode={status_code}, subStatusCode={sub_status}, statusString={status_string}, errorMsg={error_msg}",
-                "photo"
-            )
-        except Exception as exc:
-            # If we can't parse JSON, check HTTP status
-            if response.status_code == 200:
-                return SyncResult(SyncResultStatus.SUCCESS, "Face image updated successfully (PUT)", "photo")
-            else:
-                # Non-200 HTTP codes - partial to allow fallback
-                return SyncResult(
-                    SyncResultStatus.PARTIAL,
-                    f"Face image update failed: HTTP {response.status_code} - {response.text[:200]}",
-                    "photo"
-                )
+async def update_face_image_to_device_with_data(
+    device: dict,
+    angajat: dict,
+    supabase_url: Optional[str] = None,
+    photo_request: Optional[dict] = None,
+    photo_config: Optional[PhotoResolutionConfig] = None,
+    employee_no: Optional[str] = None,
+) -> SyncResult:
+    """
+    Update face image on Hikvision device via ISAPI (PUT) using direct image data (multipart binary), fallback-ready.
 
-    except ValueError as exc:
-        # Missing employee_no or model_data validation error
-        return SyncResult(
-            SyncResultStatus.SKIPPED,
-            f"Validation error: {exc}",
-            "photo"
-        )
-    except requests.exceptions.Timeout:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Request timeout - device {device.get('ip_address')} not responding",
-            "photo"
-        )
-    except requests.exceptions.ConnectionError:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Connection error - device {device.get('ip_address')} unreachable",
-            "photo"
-        )
-    except Exception as exc:
-        return SyncResult(
-            SyncResultStatus.PARTIAL,
-            f"Unexpected error: {exc}",
-            "photo"
-        )
+    Devices that can fetch faceURL themselves (see _device_supports_face_url) get
+    the resolved URL instead, and the image is not downloaded here.
 
+    Args:
+        device: Device dict with ip_address, port, username, password_encrypted
+        angajat: Angajat dict with biometrie data including foto_fata_url
+        supabase_url: Optional Supabase URL to construct full image URL if foto_fata_url is just a filename
+        photo_request: Optional foto_fata_signed_url / photo_resolver from bridge HTTP body
+        photo_config: Supabase base URL + edge API key (+ optional anon) for signed/callback resolution
+        employee_no: Already validated employee number (from _extract_employee_no)
 
-async def rate_limit_delay(seconds: float = 1.0):
-    """Rate limiting helper - delay between device API calls."""
-    import asyncio
-    await asyncio.sleep(seconds)
+    Returns:
+        SyncResult with status and message (errors are PARTIAL to allow POST fallback)
+    """
+    return await _face_with_data("update", device, angajat, supabase_url, photo_request, photo_config, employee_no)
 
@@ -0,0 +1,43 @@
+"""JSON encode/decode helpers backed by orjson.
+
+orjson is declared in requirements.txt; the stdlib ``json`` module is only used on
+platforms where it cannot be installed, so the bridge still works without it.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # declared, but keep working where no wheel is available
+    orjson = None
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data):
+        """Decode JSON from bytes or str."""
+        return orjson.loads(data)
+
+    def dumps_bytes(obj, default=str) -> bytes:
+        """Encode obj as compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(obj, default=str) -> str:
+        """Encode obj as a compact JSON string."""
+        return dumps_bytes(obj, default=default).decode()
+
+else:
+    BACKEND = "json"
+
+    def loads(data):
+        """Decode JSON from bytes or str."""
+        return json.loads(data)
+
+    def dumps(obj, default=str) -> str:
+        """Encode obj as a compact JSON string."""
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(obj, default=str) -> bytes:
+        """Encode obj as compact UTF-8 JSON bytes."""
+        return dumps(obj, default=default).encode()
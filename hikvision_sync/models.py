@@ -1,6 +1,7 @@
 """Models for sync operations."""
 
 from enum import Enum
+from typing import Optional
 
 
 class SyncResultStatus(str, Enum):
@@ -11,18 +12,35 @@ class SyncResultStatus(str, Enum):
     FATAL = "fatal"  # Fatal error - stop sync
 
 
+class SyncResultCode(str, Enum):
+    """Machine-readable outcome detail, for callers that branch on a result."""
+    ALREADY_EXISTS = "already_exists"  # Record was already on the device
+
+
 class SyncResult:
     """Result of a sync operation."""
-    def __init__(self, status: SyncResultStatus, message: str = "", step: str = ""):
+    __slots__ = ("status", "message", "step", "code")
+
+    def __init__(
+        self,
+        status: SyncResultStatus,
+        message: str = "",
+        step: str = "",
+        code: Optional[SyncResultCode] = None,
+    ):
         self.status = status
         self.message = message
         self.step = step  # "person" or "photo"
+        self.code = code
     
     def to_dict(self):
-        return {
+        result = {
             "status": self.status.value,
             "message": self.message,
             "step": self.step,
         }
+        if self.code is not None:
+            result["code"] = self.code.value
+        return result
 
 
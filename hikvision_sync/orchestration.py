@@ -1,15 +1,18 @@
 """Orchestration logic for syncing Angajati to Hikvision devices."""
 
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar, Union
 
-from .models import SyncResult, SyncResultStatus
+from .models import SyncResult, SyncResultCode, SyncResultStatus
 from .photo_url import PhotoResolutionConfig, has_face_photo_source
 
 # Set up logger for console output
 logger = logging.getLogger(__name__)
 from .isapi_client import (
     create_person_on_device,
+    create_persons_on_device,
     add_face_image_to_device,
     update_face_image_to_device,
     add_face_image_to_device_with_data,
@@ -17,6 +20,112 @@ from .isapi_client import (
     delete_user_from_device as delete_user_from_device_isapi,
 )
 
+# Fan-out limits: concurrent ISAPI operations per device host and across all devices
+_PER_HOST_CONCURRENCY = 16
+_GLOBAL_CONCURRENCY = 64
+# Angajati in flight at once in bulk syncs (each one fans out across all devices)
+_ANGAJAT_CONCURRENCY = 8
+# Per-host operation rate (one token per run_on_devices operation, not per ISAPI request):
+# short bursts allowed, then a steady rate (replaces a fixed sleep between angajati)
+_HOST_RATE_PER_SEC = 2.0
+_HOST_BURST = 4
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+_host_buckets: Dict[str, "_TokenBucket"] = {}
+_global_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class _TokenBucket:
+    """Async token bucket: up to `burst` calls at once, then `rate` calls per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def _device_host(device: dict) -> str:
+    return str(device.get("ip_address") or device.get("ip") or "")
+
+
+_T = TypeVar("_T")
+
+
+async def run_on_devices(
+    devices: List[dict],
+    operation: Callable[[dict], Awaitable[_T]],
+) -> List[Union[_T, SyncResult]]:
+    """
+    Run operation(device) for all devices concurrently.
+
+    Concurrency is capped per device host and globally so large fan-outs do not
+    overwhelm devices or the connection pool, and each host is rate limited by a
+    token bucket so different devices proceed in parallel. One token covers one
+    operation, which may issue several ISAPI requests (e.g. Person then photo, or
+    all Person batches for the device). An unexpected exception
+    from one device becomes a FATAL SyncResult for that device only.
+
+    Returns:
+        operation results (usually SyncResult) in the same order as devices
+    """
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(_GLOBAL_CONCURRENCY)
+
+    async def _one(device: dict) -> Union[_T, SyncResult]:
+        host = _device_host(device)
+        host_semaphore = _host_semaphores.get(host)
+        if host_semaphore is None:
+            host_semaphore = _host_semaphores[host] = asyncio.Semaphore(_PER_HOST_CONCURRENCY)
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = _host_buckets[host] = _TokenBucket(_HOST_RATE_PER_SEC, _HOST_BURST)
+        # Wait for the rate limit before taking any slot, so a throttled host does not hold global slots
+        await bucket.acquire()
+        async with _global_semaphore, host_semaphore:
+            try:
+                return await operation(device)
+            except Exception as exc:
+                logger.exception("Unexpected error for device %s", _device_host(device))
+                return SyncResult(SyncResultStatus.FATAL, f"Unexpected error: {exc}", "device")
+
+    return list(await asyncio.gather(*(_one(device) for device in devices)))
+
+
+async def run_for_angajati(
+    angajati: List[dict],
+    operation: Callable[[dict], Awaitable[_T]],
+    max_concurrency: int = _ANGAJAT_CONCURRENCY,
+) -> List[_T]:
+    """
+    Run operation(angajat) for all angajati, at most max_concurrency at a time.
+
+    Used by bulk syncs so one angajat's slow devices do not hold up the next
+    angajat; per-device limits still apply through run_on_devices inside operation.
+
+    Returns:
+        Results in the same order as angajati
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _one(angajat: dict) -> _T:
+        async with semaphore:
+            return await operation(angajat)
+
+    return list(await asyncio.gather(*(_one(angajat) for angajat in angajati)))
+
 
 async def sync_angajat_to_device(
     angajat: dict,
@@ -53,9 +162,10 @@ async def sync_angajat_to_device(
             "Missing employee_no - cannot sync without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Create/update Person on device
-    person_result = await create_person_on_device(device, angajat)
+    person_result = await create_person_on_device(device, angajat, employee_no=employee_no)
     
     # If person creation failed fatally, return immediately (stop sync)
     if person_result.status == SyncResultStatus.FATAL:
@@ -66,14 +176,15 @@ async def sync_angajat_to_device(
         return person_result
     
     # Check if person already existed on device (skip photo if so)
-    person_already_exists = "already exists" in person_result.message.lower() or "already exist" in person_result.message.lower()
+    person_already_exists = person_result.code == SyncResultCode.ALREADY_EXISTS
     
     if person_already_exists:
         # Person already exists - skip photo addition
         return SyncResult(
             SyncResultStatus.SUCCESS,
             f"{person_result.message}. Photo step skipped (person already exists on device)",
-            "person"
+            "person",
+            SyncResultCode.ALREADY_EXISTS,
         )
     
     # Step 3: Add face image if foto_fata_url exists (only if person was newly created)
@@ -88,7 +199,7 @@ async def sync_angajat_to_device(
         )
     
     # Attempt to add face image (person was newly created)
-    photo_result = await add_face_image_to_device(device, angajat, supabase_url)
+    photo_result = await add_face_image_to_device(device, angajat, supabase_url, employee_no=employee_no)
     
     # Determine final status:
     # - If person succeeded and photo succeeded → SUCCESS
@@ -148,6 +259,7 @@ async def sync_photo_only_to_device(
             "Missing employee_no - cannot sync photo without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Validate foto_fata_url exists
     foto_fata_url = biometrie.get("foto_fata_url")
@@ -160,7 +272,7 @@ async def sync_photo_only_to_device(
         )
     
     # Step 3: Add face image (skip person creation)
-    photo_result = await add_face_image_to_device(device, angajat, supabase_url)
+    photo_result = await add_face_image_to_device(device, angajat, supabase_url, employee_no=employee_no)
     
     # Return the photo result directly
     return photo_result
@@ -207,6 +319,7 @@ async def update_photo_to_device(
             "Missing employee_no - cannot update photo without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Validate foto_fata_url exists
     foto_fata_url = biometrie.get("foto_fata_url")
@@ -219,9 +332,9 @@ async def update_photo_to_device(
         )
     
     # Step 3: Attempt PUT update
-    print(f"  [UPDATE_PHOTO] Attempting PUT update for employee_no={biometrie.get('employee_no')}")
-    put_result = await update_face_image_to_device(device, angajat, supabase_url)
-    print(f"  [UPDATE_PHOTO] PUT result: status={put_result.status.value}, message={put_result.message}")
+    logger.info("[UPDATE_PHOTO] Attempting PUT update for employee_no=%s", employee_no)
+    put_result = await update_face_image_to_device(device, angajat, supabase_url, employee_no=employee_no)
+    logger.info("[UPDATE_PHOTO] PUT result: status=%s, message=%s", put_result.status.value, put_result.message)
     
     # Step 4: If PUT succeeded, return SUCCESS
     if put_result.status == SyncResultStatus.SUCCESS:
@@ -233,9 +346,9 @@ async def update_photo_to_device(
     
     # Step 5: PUT failed - fallback to POST (create)
     # Note: PUT failures return PARTIAL status, so we fallback to POST
-    print(f"  [UPDATE_PHOTO] PUT failed, falling back to POST for employee_no={biometrie.get('employee_no')}")
-    post_result = await add_face_image_to_device(device, angajat, supabase_url)
-    print(f"  [UPDATE_PHOTO] POST result: status={post_result.status.value}, message={post_result.message}")
+    logger.info("[UPDATE_PHOTO] PUT failed, falling back to POST for employee_no=%s", employee_no)
+    post_result = await add_face_image_to_device(device, angajat, supabase_url, employee_no=employee_no)
+    logger.info("[UPDATE_PHOTO] POST result: status=%s, message=%s", post_result.status.value, post_result.message)
     
     # Return POST result (SUCCESS if fallback worked, PARTIAL if both failed)
     if post_result.status == SyncResultStatus.SUCCESS:
@@ -261,7 +374,7 @@ async def sync_angajat_to_device_with_data(
     photo_config: Optional[PhotoResolutionConfig] = None,
 ) -> SyncResult:
     """
-    Sync one Angajat to one Hikvision device using direct image data (base64).
+    Sync one Angajat to one Hikvision device using direct image data (multipart binary).
     
     Steps:
     1. Validate employee_no exists (skip if missing)
@@ -292,10 +405,27 @@ async def sync_angajat_to_device_with_data(
             "Missing employee_no - cannot sync without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Create/update Person on device
-    person_result = await create_person_on_device(device, angajat)
+    person_result = await create_person_on_device(device, angajat, employee_no=employee_no)
     
+    # Step 3: Add face image if the person was newly created and a photo source exists
+    result = _result_without_photo_step(angajat, person_result, photo_request)
+    if result is not None:
+        return result
+    return await _add_photo_after_person(angajat, device, employee_no, supabase_url, photo_request, photo_config)
+
+
+def _result_without_photo_step(
+    angajat: dict,
+    person_result: SyncResult,
+    photo_request: Optional[dict],
+) -> Optional[SyncResult]:
+    """
+    Final result for an angajat/device pair whose Person step needs no photo upload
+    after it (person failed, already existed, or no photo source), else None.
+    """
     # If person creation failed fatally, return immediately (stop sync)
     if person_result.status == SyncResultStatus.FATAL:
         return person_result
@@ -305,20 +435,18 @@ async def sync_angajat_to_device_with_data(
         return person_result
     
     # Check if person already existed on device (skip photo if so)
-    person_already_exists = "already exists" in person_result.message.lower() or "already exist" in person_result.message.lower()
-    
-    if person_already_exists:
+    if person_result.code == SyncResultCode.ALREADY_EXISTS:
         # Person already exists - skip photo addition
         return SyncResult(
             SyncResultStatus.SUCCESS,
             f"{person_result.message}. Photo step skipped (person already exists on device)",
-            "person"
+            "person",
+            SyncResultCode.ALREADY_EXISTS,
         )
     
-    # Step 3: Add face image if a photo source exists (only if person was newly created)
     logger.info(
         "Checking for face photo source (foto_fata_url / signed / callback): biometrie.foto_fata_url=%s",
-        biometrie.get("foto_fata_url"),
+        angajat.get("biometrie", {}).get("foto_fata_url"),
     )
 
     if not has_face_photo_source(angajat, photo_request):
@@ -328,18 +456,29 @@ async def sync_angajat_to_device_with_data(
             f"Person created successfully. No photo URL available - photo step skipped",
             "person"
         )
+    return None
+
 
-    # Attempt to add face image using direct image data (person was newly created)
-    logger.info(f"Calling add_face_image_to_device_with_data for employee_no={biometrie.get('employee_no')}")
+async def _add_photo_after_person(
+    angajat: dict,
+    device: dict,
+    employee_no: str,
+    supabase_url: Optional[str],
+    photo_request: Optional[dict],
+    photo_config: Optional[PhotoResolutionConfig],
+) -> SyncResult:
+    """Add the face image for a newly created person (direct image data) and combine the outcome."""
+    logger.debug("Calling add_face_image_to_device_with_data for employee_no=%s", employee_no)
     photo_result = await add_face_image_to_device_with_data(
-        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config
+        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config,
+        employee_no=employee_no,
     )
-    logger.info(f"Photo sync result: status={photo_result.status.value}, message={photo_result.message}")
+    logger.info("Photo sync result: status=%s, message=%s", photo_result.status.value, photo_result.message)
     
     # Determine final status:
     # - If person succeeded and photo succeeded → SUCCESS
     # - If person succeeded but photo failed → PARTIAL
-    # - Person failures already handled above (FATAL returned)
+    # - Person failures already handled by _result_without_photo_step
     
     if photo_result.status == SyncResultStatus.SUCCESS:
         return SyncResult(
@@ -356,6 +495,71 @@ async def sync_angajat_to_device_with_data(
         )
 
 
+async def sync_angajati_to_devices_with_data(
+    angajati: List[dict],
+    devices: List[dict],
+    supabase_url: Optional[str] = None,
+    photo_request: Optional[dict] = None,
+    photo_config: Optional[PhotoResolutionConfig] = None,
+) -> List[List[SyncResult]]:
+    """
+    Bulk sync_angajat_to_device_with_data: every angajat to every device.
+
+    The Person step is batched per device via create_persons_on_device (a few
+    requests per device instead of one per angajat). The photo step then runs from
+    those in-order Person results, only for the pairs that still need a photo,
+    several angajati at a time under the run_on_devices limits.
+
+    Returns:
+        For each angajat (input order), one SyncResult per device (devices order)
+    """
+    results: List[List[Optional[SyncResult]]] = [[None] * len(devices) for _ in angajati]
+    valid = []  # (angajat index, employee_no)
+    for index, angajat in enumerate(angajati):
+        employee_no = angajat.get("biometrie", {}).get("employee_no")
+        if employee_no:
+            valid.append((index, str(employee_no)))
+        else:
+            results[index] = [SyncResult(
+                SyncResultStatus.SKIPPED,
+                "Missing employee_no - cannot sync without employee number",
+                "validation"
+            )] * len(devices)
+
+    # Step 1: Person records, batched per device (one column of results per device)
+    batch = [angajati[index] for index, _ in valid]
+    person_columns = await run_on_devices(devices, lambda device: create_persons_on_device(device, batch))
+
+    # Step 2: Photo for each newly created person, per angajat across the devices that need it
+    photo_devices: Dict[int, List[int]] = {}  # id(angajat) -> device indexes needing the photo step
+    for position, (index, _) in enumerate(valid):
+        angajat = angajati[index]
+        for device_index, column in enumerate(person_columns):
+            # run_on_devices turns an unexpected error into one FATAL result for the device
+            person_result = column if isinstance(column, SyncResult) else column[position]
+            result = _result_without_photo_step(angajat, person_result, photo_request)
+            if result is None:
+                photo_devices.setdefault(id(angajat), []).append(device_index)
+            else:
+                results[index][device_index] = result
+
+    async def _photo_step(angajat: dict) -> List[SyncResult]:
+        employee_no = str(angajat["biometrie"]["employee_no"])
+        return await run_on_devices(
+            [devices[device_index] for device_index in photo_devices[id(angajat)]],
+            lambda device: _add_photo_after_person(
+                angajat, device, employee_no, supabase_url, photo_request, photo_config
+            ),
+        )
+
+    photo_indexes = [index for index, _ in valid if id(angajati[index]) in photo_devices]
+    photo_results = await run_for_angajati([angajati[index] for index in photo_indexes], _photo_step)
+    for index, device_results in zip(photo_indexes, photo_results):
+        for device_index, result in zip(photo_devices[id(angajati[index])], device_results):
+            results[index][device_index] = result
+    return results
+
+
 async def sync_photo_only_to_device_with_data(
     angajat: dict,
     device: dict,
@@ -364,7 +568,7 @@ async def sync_photo_only_to_device_with_data(
     photo_config: Optional[PhotoResolutionConfig] = None,
 ) -> SyncResult:
     """
-    Sync ONLY the face photo to one Hikvision device using direct image data (base64) (skips person creation).
+    Sync ONLY the face photo to one Hikvision device using direct image data (multipart binary) (skips person creation).
     
     This assumes the person already exists on the device.
     Use this when you only want to update/add the photo without touching person data.
@@ -398,6 +602,7 @@ async def sync_photo_only_to_device_with_data(
             "Missing employee_no - cannot sync photo without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Validate a face photo source exists
     if not has_face_photo_source(angajat, photo_request):
@@ -409,7 +614,8 @@ async def sync_photo_only_to_device_with_data(
 
     # Step 3: Add face image using direct image data (skip person creation)
     photo_result = await add_face_image_to_device_with_data(
-        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config
+        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config,
+        employee_no=employee_no,
     )
     
     # Return the photo result directly
@@ -424,7 +630,7 @@ async def update_photo_to_device_with_data(
     photo_config: Optional[PhotoResolutionConfig] = None,
 ) -> SyncResult:
     """
-    Update face photo on one Hikvision device with PUT fallback to POST using direct image data (base64).
+    Update face photo on one Hikvision device with PUT fallback to POST using direct image data (multipart binary).
     
     This attempts to update an existing face image using PUT request.
     If PUT fails, it falls back to POST (create) to ensure the photo is synced.
@@ -461,6 +667,7 @@ async def update_photo_to_device_with_data(
             "Missing employee_no - cannot update photo without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Validate a face photo source exists
     if not has_face_photo_source(angajat, photo_request):
@@ -471,11 +678,12 @@ async def update_photo_to_device_with_data(
         )
 
     # Step 3: Attempt PUT update using direct image data
-    print(f"  [UPDATE_PHOTO] Attempting PUT update for employee_no={biometrie.get('employee_no')}")
+    logger.info("[UPDATE_PHOTO] Attempting PUT update for employee_no=%s", employee_no)
     put_result = await update_face_image_to_device_with_data(
-        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config
+        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config,
+        employee_no=employee_no,
     )
-    print(f"  [UPDATE_PHOTO] PUT result: status={put_result.status.value}, message={put_result.message}")
+    logger.info("[UPDATE_PHOTO] PUT result: status=%s, message=%s", put_result.status.value, put_result.message)
     
     # Step 4: If PUT succeeded, return SUCCESS
     if put_result.status == SyncResultStatus.SUCCESS:
@@ -487,11 +695,12 @@ async def update_photo_to_device_with_data(
     
     # Step 5: PUT failed - fallback to POST (create) using direct image data
     # Note: PUT failures return PARTIAL status, so we fallback to POST
-    print(f"  [UPDATE_PHOTO] PUT failed, falling back to POST for employee_no={biometrie.get('employee_no')}")
+    logger.info("[UPDATE_PHOTO] PUT failed, falling back to POST for employee_no=%s", employee_no)
     post_result = await add_face_image_to_device_with_data(
-        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config
+        device, angajat, supabase_url, photo_request=photo_request, photo_config=photo_config,
+        employee_no=employee_no,
     )
-    print(f"  [UPDATE_PHOTO] POST result: status={post_result.status.value}, message={post_result.message}")
+    logger.info("[UPDATE_PHOTO] POST result: status=%s, message=%s", post_result.status.value, post_result.message)
     
     # Return POST result (SUCCESS if fallback worked, PARTIAL if both failed)
     if post_result.status == SyncResultStatus.SUCCESS:
@@ -544,11 +753,12 @@ async def delete_user_from_device(
             "Missing employee_no - cannot delete user without employee number",
             "validation"
         )
+    employee_no = str(employee_no)
     
     # Step 2: Call ISAPI delete_user_from_device() function
     # Note: The ISAPI function handles validation and will return SKIPPED if employee_no is missing,
     # but we check here first to avoid unnecessary API calls
-    result = await delete_user_from_device_isapi(device, angajat)
+    result = await delete_user_from_device_isapi(device, angajat, employee_no=employee_no)
     
     # Return result directly (no additional steps needed for deletion)
     return result
@@ -16,6 +16,9 @@ from typing import Any, Dict, Optional
 
 import httpx
 
+from . import json_codec
+from .http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
 
@@ -96,37 +99,37 @@ async def _http_get_photo_signed_url(
     last_status: Optional[int] = None
     for attempt in range(2):
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url, params=params, headers=headers)
-                last_status = response.status_code
-                if response.status_code >= 500 and attempt == 0:
-                    logger.warning(
-                        "get-photo-url 5xx for angajat_id=%s status=%s, retrying once",
-                        angajat_id,
-                        response.status_code,
-                    )
-                    continue
-                if not response.is_success:
-                    logger.warning(
-                        "get-photo-url failed for angajat_id=%s: HTTP %s %s",
-                        angajat_id,
-                        response.status_code,
-                        (response.text or "")[:200],
-                    )
-                    return None
-                try:
-                    body = response.json()
-                except Exception as exc:
-                    logger.warning("get-photo-url invalid JSON for angajat_id=%s: %s", angajat_id, exc)
-                    return None
-                signed = _signed_url_from_proxy_json(body)
-                if not signed:
-                    logger.warning(
-                        "get-photo-url response missing signed URL for angajat_id=%s keys=%s",
-                        angajat_id,
-                        list(body.keys()) if isinstance(body, dict) else type(body),
-                    )
-                return signed
+            client = await get_http_client()
+            response = await client.get(url, params=params, headers=headers, timeout=10.0)
+            last_status = response.status_code
+            if response.status_code >= 500 and attempt == 0:
+                logger.warning(
+                    "get-photo-url 5xx for angajat_id=%s status=%s, retrying once",
+                    angajat_id,
+                    response.status_code,
+                )
+                continue
+            if not response.is_success:
+                logger.warning(
+                    "get-photo-url failed for angajat_id=%s: HTTP %s %s",
+                    angajat_id,
+                    response.status_code,
+                    (response.text or "")[:200],
+                )
+                return None
+            try:
+                body = json_codec.loads(response.content)
+            except Exception as exc:
+                logger.warning("get-photo-url invalid JSON for angajat_id=%s: %s", angajat_id, exc)
+                return None
+            signed = _signed_url_from_proxy_json(body)
+            if not signed:
+                logger.warning(
+                    "get-photo-url response missing signed URL for angajat_id=%s keys=%s",
+                    angajat_id,
+                    list(body.keys()) if isinstance(body, dict) else type(body),
+                )
+            return signed
         except httpx.TimeoutException as exc:
             logger.warning("get-photo-url timeout for angajat_id=%s: %s", angajat_id, exc)
             return None
@@ -1,11 +1,16 @@
 """Supabase client helpers for fetching data via Edge Function."""
 
-import json
+import asyncio
 import logging
 import os
 import httpx
 from typing import List, Optional
 
+from . import json_codec
+from .http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
 
 class SupabaseClient:
     """Client for Supabase Edge Function API."""
@@ -37,15 +42,15 @@ class SupabaseClient:
         headers = self._get_headers()
         url = f"{self.edge_function_url}?action=get-active-devices"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers=headers,
-                timeout=10.0,
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("data", [])
+        client = await get_http_client()
+        response = await client.get(
+            url,
+            headers=headers,
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        result = json_codec.loads(response.content)
+        return result.get("data", [])
     
     async def get_angajat_with_biometrie(self, angajat_id: str) -> Optional[dict]:
         """
@@ -55,16 +60,16 @@ class SupabaseClient:
         headers = self._get_headers()
         url = f"{self.edge_function_url}?action=get-angajat&angajat_id={angajat_id}"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers=headers,
-                timeout=30.0,  # Increased timeout for Edge Function calls
-            )
-            response.raise_for_status()
-            result = response.json()
-            data = result.get("data")
-            return data if data else None
+        client = await get_http_client()
+        response = await client.get(
+            url,
+            headers=headers,
+            timeout=30.0,  # Increased timeout for Edge Function calls
+        )
+        response.raise_for_status()
+        result = json_codec.loads(response.content)
+        data = result.get("data")
+        return data if data else None
     
     async def get_all_active_angajati_with_biometrie(self) -> List[dict]:
         """
@@ -75,15 +80,15 @@ class SupabaseClient:
         headers = self._get_headers()
         url = f"{self.edge_function_url}?action=get-angajati-biometrie"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers=headers,
-                timeout=30.0,  # Increased timeout for Edge Function calls
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("data", [])
+        client = await get_http_client()
+        response = await client.get(
+            url,
+            headers=headers,
+            timeout=30.0,  # Increased timeout for Edge Function calls
+        )
+        response.raise_for_status()
+        result = json_codec.loads(response.content)
+        return result.get("data", [])
     
     async def save_pontaj_event(self, angajat_id: str, dispozitiv_id: str, event_time: str) -> dict:
         """
@@ -103,16 +108,23 @@ class SupabaseClient:
             "event_time": event_time,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=10.0,
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("data", result)
+        client = await get_http_client()
+        response = await client.post(
+            url,
+            headers=headers,
+            json=payload,
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        result = json_codec.loads(response.content)
+        return result.get("data", result)
+    
+    def _event_headers(self) -> dict:
+        """Get headers for event function calls."""
+        return {
+            "X-API-Key": self.event_function_api_key,
+            "Content-Type": "application/json",
+        }
     
     async def save_access_event(self, event_data: dict) -> dict:
         """
@@ -128,38 +140,55 @@ class SupabaseClient:
             This method uses a different Edge Function endpoint than other methods.
             Errors are caught and returned as dict (non-blocking) rather than raised.
         """
-        # Event function endpoint/key are configured per client (with env fallback)
-        endpoint_url = self.event_function_url
-        api_key = self.event_function_api_key
+        client = await get_http_client()
+        return await self._post_access_event(client, event_data)
+    
+    async def save_access_events_bulk(self, events: List[dict]) -> List[dict]:
+        """
+        Save several access events over one pooled connection.
         
-        headers = {
-            "X-API-Key": api_key,
-            "Content-Type": "application/json",
-        }
+        The event function accepts a single event per call, so events are posted
+        concurrently on a shared AsyncClient rather than as one array payload.
+        
+        Returns:
+            list of result dicts in the same order as events (see save_access_event)
+        """
+        if not events:
+            return []
+        client = await get_http_client()
+        return list(await asyncio.gather(*(self._post_access_event(client, event) for event in events)))
+    
+    async def _post_access_event(self, client: httpx.AsyncClient, event_data: dict) -> dict:
+        """POST one access event on an open client; errors are returned as dict."""
+        endpoint_url = self.event_function_url
+        headers = self._event_headers()
         
-        # Console output for testing
-        api_key_masked = f"{api_key[:10]}...{api_key[-4:]}" if len(api_key) > 14 else "***"
-        print(f"INFO:     [SUPABASE EVENT CALL] POST {endpoint_url}")
-        print(f"INFO:     [SUPABASE EVENT CALL] Event data: {json.dumps(event_data, default=str)[:200]}")
+        logger.debug("[SUPABASE EVENT CALL] POST %s", endpoint_url)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SUPABASE EVENT CALL] Event data: %s", json_codec.dumps(event_data)[:200])
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    endpoint_url,
-                    headers=headers,
-                    json=event_data,
-                    timeout=10.0,
+            response = await client.post(
+                endpoint_url,
+                headers=headers,
+                json=event_data,
+                timeout=10.0,
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "[SUPABASE EVENT CALL] Response: %s %s body=%s",
+                    response.status_code, response.reason_phrase, response.content[:200].decode("utf-8", "replace"),
                 )
-                print(f"INFO:     [SUPABASE EVENT CALL] Response: {response.status_code} {response.reason_phrase}")
-                print(f"INFO:     [SUPABASE EVENT CALL] Response body: {response.text[:200]}")
-                response.raise_for_status()
-                result = response.json()
-                print(f"INFO:     [SUPABASE EVENT CALL] Success - Event saved to database")
-                return {"status": "success", "data": result}
+            response.raise_for_status()
+            result = json_codec.loads(response.content)
+            logger.debug("[SUPABASE EVENT CALL] Success - Event saved to database")
+            return {"status": "success", "data": result}
         except httpx.HTTPStatusError as exc:
             # HTTP error (4xx, 5xx)
-            print(f"ERROR:    [SUPABASE EVENT CALL] HTTP Error {exc.response.status_code}: {exc}")
-            print(f"ERROR:    [SUPABASE EVENT CALL] Response: {exc.response.text[:200] if exc.response else 'No response'}")
+            logger.error(
+                "[SUPABASE EVENT CALL] HTTP Error %s: %s. Response: %s",
+                exc.response.status_code, exc, exc.response.text[:200] if exc.response else "No response",
+            )
             return {
                 "status": "error",
                 "error_type": "HTTPStatusError",
@@ -169,7 +198,7 @@ class SupabaseClient:
             }
         except httpx.RequestError as exc:
             # Network error (timeout, connection error, etc.)
-            print(f"ERROR:    [SUPABASE EVENT CALL] Request Error: {exc}")
+            logger.error("[SUPABASE EVENT CALL] Request Error: %s", exc)
             return {
                 "status": "error",
                 "error_type": "RequestError",
@@ -177,7 +206,7 @@ class SupabaseClient:
             }
         except Exception as exc:
             # Any other unexpected error
-            print(f"ERROR:    [SUPABASE EVENT CALL] Unexpected Error: {exc}")
+            logger.error("[SUPABASE EVENT CALL] Unexpected Error: %s", exc)
             return {
                 "status": "error",
                 "error_type": type(exc).__name__,
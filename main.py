@@ -4,6 +4,7 @@ import json
 import logging
 import os
 import time
+import traceback
 import uuid
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -19,28 +20,46 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
+from hikvision_sync import json_codec
 from hikvision_sync.photo_url import PhotoResolutionConfig
+from hikvision_sync.http_client import aclose_http_client as aclose_supabase_http_client
 from hikvision_sync.supabase_client import SupabaseClient
-from hikvision_sync.isapi_client import create_person_on_device, add_face_image_to_device, rate_limit_delay
+from hikvision_sync.isapi_client import (
+    aclose_http_clients,
+    add_face_image_to_device,
+    create_person_on_device,
+    prime_device_auth,
+)
 from hikvision_sync.orchestration import (
     sync_angajat_to_device_with_data,
+    sync_angajati_to_devices_with_data,
     sync_photo_only_to_device_with_data,
     update_photo_to_device_with_data,
-    delete_user_from_device
+    delete_user_from_device,
+    run_on_devices,
+)
+from hikvision_sync.events import (
+    DailyLogger,
+    enqueue_access_event_save,
+    flush_access_event_saves,
+    process_event_request,
 )
-from hikvision_sync.events import DailyLogger, process_event_request
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging to output to console
+# Configure logging to output to console; LOG_LEVEL=DEBUG enables the ISAPI request/response dumps
+_LOG_LEVEL = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").strip().upper())
+if not isinstance(_LOG_LEVEL, int):
+    _LOG_LEVEL = logging.INFO
 logging.basicConfig(
-    level=logging.INFO,
+    level=_LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler()  # Output to console
     ]
 )
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -60,6 +79,19 @@ async def add_security_headers(request: Request, call_next):
     return response
 
 
+@app.on_event("shutdown")
+async def _flush_pending_event_saves():
+    """Give queued access-event saves a chance to reach Supabase before exit."""
+    await flush_access_event_saves()
+
+
+@app.on_event("shutdown")
+async def _close_http_clients():
+    """Close pooled device/download/Supabase HTTP clients."""
+    await aclose_http_clients()
+    await aclose_supabase_http_client()
+
+
 _ROOT_DIR = Path(__file__).resolve().parent
 _LOG_DIR = _ROOT_DIR / "logs"
 _APP_CONFIG_PATH = _ROOT_DIR / "config" / "app_settings.json"
@@ -446,44 +478,14 @@ def _resolve_sync_supabase(body: dict) -> Tuple[Optional[SupabaseClient], Option
 
 
 async def _save_access_event_to_targets(parsed_event: dict, target_envs: List[str], event_logger: logging.Logger) -> Dict[str, str]:
-    tasks = []
-    task_envs = []
+    """Queue the event for each target environment; saves complete in the background."""
+    statuses: Dict[str, str] = {}
     for env_name in target_envs:
         client = _SUPABASE_CLIENTS.get(env_name)
         if not client:
             event_logger.error("Missing Supabase client for target environment '%s'", env_name)
             continue
-        task_envs.append(env_name)
-        tasks.append(client.save_access_event(parsed_event))
-
-    if not tasks:
-        return {}
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    statuses: Dict[str, str] = {}
-
-    for env_name, result in zip(task_envs, results):
-        if isinstance(result, Exception):
-            statuses[env_name] = "error"
-            event_logger.error("Unexpected error saving event to %s: %s", env_name.upper(), result)
-            continue
-
-        if result.get("status") == "success":
-            statuses[env_name] = "success"
-            event_logger.info("Successfully saved access event to %s", env_name.upper())
-        else:
-            statuses[env_name] = "error"
-            error_type = result.get("error_type", "Unknown")
-            error_msg = result.get("error", "Unknown error")
-            status_code = result.get("status_code", "")
-            event_logger.error(
-                "Failed saving access event to %s: %s - %s%s",
-                env_name.upper(),
-                error_type,
-                error_msg,
-                f" (Status: {status_code})" if status_code else "",
-            )
-
+        statuses[env_name] = enqueue_access_event_save(client, parsed_event, event_logger, label=env_name.upper())
     return statuses
 
 
@@ -538,9 +540,7 @@ class _AuthVerifier:
             except Exception as jwks_exc:
                 # JWKS failed, fall through to JWT secret fallback
                 # Log the error for debugging (can be removed later)
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.debug(f"JWKS verification failed: {jwks_exc}, trying JWT secret fallback")
+                logger.debug("JWKS verification failed: %s, trying JWT secret fallback", jwks_exc)
         
         # Fall back to JWT secret (for HS256 tokens)
         if self.jwt_secret:
@@ -657,14 +657,14 @@ async def sync_angajat_all_devices(
         ]
     }
     """
-    # Read and print raw request body
+    # Read raw request body
     body = await request.body()
-    print("RAW BODY:", body)
+    logger.debug("RAW BODY: %r", body)
     
     # Parse JSON body
     try:
-        body = json.loads(body)
-    except json.JSONDecodeError:
+        body = json_codec.loads(body)
+    except ValueError:  # JSONDecodeError of whichever backend json_codec uses
         return {
             "status": "error",
             "error": "Invalid JSON in request body"
@@ -720,19 +720,20 @@ async def sync_angajat_all_devices(
             "fatal": 0
         }
         
-        # Sync to each device sequentially (using existing sync_angajat_to_device function)
-        for device in devices:
-            device_id = device.get("id", "unknown")
-            device_ip = device.get("ip_address", "unknown")
-            
-            # Sync to this device using direct image data functionality
-            result = await sync_angajat_to_device_with_data(
+        # Run on all devices concurrently (bounded per host and globally)
+        results = await run_on_devices(
+            devices,
+            lambda device: sync_angajat_to_device_with_data(
                 angajat,
                 device,
                 supabase_url,
                 photo_request=photo_request,
                 photo_config=photo_config,
-            )
+            ),
+        )
+        for device, result in zip(devices, results):
+            device_id = device.get("id", "unknown")
+            device_ip = device.get("ip_address", "unknown")
             
             # Record result
             per_device_results.append({
@@ -745,10 +746,6 @@ async def sync_angajat_all_devices(
             
             # Update summary counts
             summary[result.status.value] = summary.get(result.status.value, 0) + 1
-            
-            # Add delay between devices (except after the last one)
-            if device != devices[-1]:
-                await rate_limit_delay(1.0)
         
         # Return structured result (always 200, status in payload)
         return {
@@ -758,7 +755,6 @@ async def sync_angajat_all_devices(
         }
         
     except Exception as exc:
-        import traceback
         return {
             "status": "error",
             "error": str(exc),
@@ -854,14 +850,15 @@ async def delete_user(
             "fatal": 0
         }
         
-        # Delete from each device sequentially (using delete_user_from_device function)
-        for device in devices:
+        # Run on all devices concurrently (bounded per host and globally)
+        results = await run_on_devices(
+            devices,
+            lambda device: delete_user_from_device(angajat, device),
+        )
+        for device, result in zip(devices, results):
             device_id = device.get("id", "unknown")
             device_ip = device.get("ip_address", "unknown")
             
-            # Delete from this device using orchestration function
-            result = await delete_user_from_device(angajat, device)
-            
             # Record result
             per_device_results.append({
                 "device_id": device_id,
@@ -873,10 +870,6 @@ async def delete_user(
             
             # Update summary counts
             summary[result.status.value] = summary.get(result.status.value, 0) + 1
-            
-            # Add delay between devices (except after the last one)
-            if device != devices[-1]:
-                await rate_limit_delay(1.0)
         
         # Return structured result (always 200, status in payload)
         return {
@@ -886,7 +879,6 @@ async def delete_user(
         }
         
     except Exception as exc:
-        import traceback
         return {
             "status": "error",
             "error": str(exc),
@@ -993,8 +985,18 @@ async def sync_all_to_all_devices(
             "fatal": 0
         }
         
-        # Sync each angajat to all devices sequentially
-        for angajat in angajati:
+        # Cache each device's digest challenge once instead of in every concurrent first request
+        await asyncio.gather(*(prime_device_auth(device) for device in devices))
+        
+        # Person records go out in batches per device; photos follow for newly created persons
+        per_angajat_results = await sync_angajati_to_devices_with_data(
+            angajati,
+            devices,
+            supabase_url,
+            photo_request=photo_request,
+            photo_config=photo_config,
+        )
+        for angajat, results in zip(angajati, per_angajat_results):
             angajat_id = angajat.get("id", "unknown")
             angajat_name = f"{angajat.get('nume', '')} {angajat.get('prenume', '')}".strip() or angajat.get("nume_complet", "Unknown")
             
@@ -1007,19 +1009,8 @@ async def sync_all_to_all_devices(
                 "fatal": 0
             }
             
-            # Sync to each device sequentially
-            for device in devices:
+            for device, result in zip(devices, results):
                 device_id = device.get("id", "unknown")
-                device_ip = device.get("ip_address", "unknown")
-                
-                # Sync to this device using direct image data (handles missing photo URLs automatically)
-                result = await sync_angajat_to_device_with_data(
-                    angajat,
-                    device,
-                    supabase_url,
-                    photo_request=photo_request,
-                    photo_config=photo_config,
-                )
                 
                 # Record device result in new format
                 device_success = result.status.value in ("success", "partial")
@@ -1036,10 +1027,6 @@ async def sync_all_to_all_devices(
                 
                 # Update total summary
                 total_summary[result.status.value] = total_summary.get(result.status.value, 0) + 1
-                
-                # Add delay between devices (except after the last device for this angajat)
-                if device != devices[-1]:
-                    await rate_limit_delay(1.0)
             
             # Determine overall employee result status
             # success: true if at least one device succeeded and no fatal errors
@@ -1069,10 +1056,6 @@ async def sync_all_to_all_devices(
                 "error": employee_error,
                 "deviceResults": device_results
             })
-            
-            # Add delay between angajati (except after the last one)
-            if angajat != angajati[-1]:
-                await rate_limit_delay(1.0)
         
         # Return structured result (always 200, status in payload)
         return {
@@ -1082,7 +1065,6 @@ async def sync_all_to_all_devices(
         }
         
     except Exception as exc:
-        import traceback
         return {
             "status": "error",
             "error": str(exc),
@@ -1183,19 +1165,20 @@ async def sync_angajat_photo_only(
             "fatal": 0
         }
         
-        # Sync photo to each device sequentially (using sync_photo_only_to_device function)
-        for device in devices:
-            device_id = device.get("id", "unknown")
-            device_ip = device.get("ip_address", "unknown")
-            
-            # Sync photo only to this device using direct image data (skips person creation)
-            result = await sync_photo_only_to_device_with_data(
+        # Run on all devices concurrently (bounded per host and globally)
+        results = await run_on_devices(
+            devices,
+            lambda device: sync_photo_only_to_device_with_data(
                 angajat,
                 device,
                 supabase_url,
                 photo_request=photo_request,
                 photo_config=photo_config,
-            )
+            ),
+        )
+        for device, result in zip(devices, results):
+            device_id = device.get("id", "unknown")
+            device_ip = device.get("ip_address", "unknown")
             
             # Record result
             per_device_results.append({
@@ -1208,10 +1191,6 @@ async def sync_angajat_photo_only(
             
             # Update summary counts
             summary[result.status.value] = summary.get(result.status.value, 0) + 1
-            
-            # Add delay between devices (except after the last one)
-            if device != devices[-1]:
-                await rate_limit_delay(1.0)
         
         # Return structured result (always 200, status in payload)
         return {
@@ -1221,7 +1200,6 @@ async def sync_angajat_photo_only(
         }
         
     except Exception as exc:
-        import traceback
         return {
             "status": "error",
             "error": str(exc),
@@ -1323,19 +1301,20 @@ async def update_angajat_photo(
             "fatal": 0
         }
         
-        # Update photo to each device sequentially (using update_photo_to_device function)
-        for device in devices:
-            device_id = device.get("id", "unknown")
-            device_ip = device.get("ip_address", "unknown")
-            
-            # Update photo to this device using direct image data (PUT with POST fallback)
-            result = await update_photo_to_device_with_data(
+        # Run on all devices concurrently (bounded per host and globally)
+        results = await run_on_devices(
+            devices,
+            lambda device: update_photo_to_device_with_data(
                 angajat,
                 device,
                 supabase_url,
                 photo_request=photo_request,
                 photo_config=photo_config,
-            )
+            ),
+        )
+        for device, result in zip(devices, results):
+            device_id = device.get("id", "unknown")
+            device_ip = device.get("ip_address", "unknown")
             
             # Record result
             per_device_results.append({
@@ -1348,10 +1327,6 @@ async def update_angajat_photo(
             
             # Update summary counts
             summary[result.status.value] = summary.get(result.status.value, 0) + 1
-            
-            # Add delay between devices (except after the last one)
-            if device != devices[-1]:
-                await rate_limit_delay(1.0)
         
         # Return structured result (always 200, status in payload)
         return {
@@ -1361,7 +1336,6 @@ async def update_angajat_photo(
         }
         
     except Exception as exc:
-        import traceback
         return {
             "status": "error",
             "error": str(exc),
@@ -1371,7 +1345,11 @@ async def update_angajat_photo(
 
 
 # Initialize event loggers
-_EVENT_LOGGER = DailyLogger("hikvision_events", "hikvision_events_{date}.log", _LOG_DIR, subfolder="hikvision_events")
+# Event files always keep INFO records; LOG_LEVEL=DEBUG additionally writes raw event bodies
+_EVENT_LOGGER = DailyLogger(
+    "hikvision_events", "hikvision_events_{date}.log", _LOG_DIR, subfolder="hikvision_events",
+    level=min(_LOG_LEVEL, logging.INFO),
+)
 _ACCESS_LOGGER = DailyLogger("hikvision_access", "Access Log {date}.log", _LOG_DIR, subfolder="access")
 
 @app.post("/{full_path:path}")